@@ -0,0 +1,101 @@
+# Model and host settings shared by the sample scripts and the command-line entry point (cli.py).
+# Every script used to repeat the same setup: load .env, read API_HOST, then build an Azure OpenAI or
+# GitHub Models configuration and client. These helpers resolve it once per process, and import
+# openai and azure.identity only when a client is actually built, so importing this module is cheap.
+
+import functools
+import os
+
+from dotenv import load_dotenv
+
+GITHUB_MODELS_ENDPOINT = "https://models.inference.ai.azure.com"
+TOKEN_SCOPE = "https://cognitiveservices.azure.com/.default"
+AZURE_OPENAI_API_VERSION = "2024-03-01-preview"
+API_HOSTS = ("azure", "github")
+# Keep-alive connections each pooled chat client holds (see inference_pool.py and azure_openai_rest.py).
+DEFAULT_POOL_SIZE = int(os.getenv("AZURE_AI_POOL_SIZE", "32"))
+
+
+@functools.cache
+def load_environment():
+    """
+    Load .env into the environment; later calls in the same process do nothing.
+    """
+    load_dotenv(override=True)
+
+
+def get_api_host() -> str:
+    load_environment()
+    api_host = os.getenv("API_HOST", "github")
+    if api_host not in API_HOSTS:
+        raise ValueError(f"Unsupported API_HOST {api_host!r}: use one of {', '.join(API_HOSTS)}.")
+    return api_host
+
+
+def get_model_config() -> dict:
+    """
+    Judge model configuration for the Azure AI Evaluation SDK evaluators: an AzureOpenAIModelConfiguration
+    for Azure, an OpenAIModelConfiguration for GitHub Models.
+    """
+    if get_api_host() == "azure":
+        return {
+            "azure_endpoint": os.environ["AZURE_AI_ENDPOINT"],
+            "azure_deployment": os.environ["AZURE_AI_CHAT_DEPLOYMENT"],
+        }
+    return {
+        "type": "openai",
+        "api_key": os.environ["GITHUB_TOKEN"],
+        "base_url": GITHUB_MODELS_ENDPOINT,
+        "model": os.getenv("GITHUB_MODEL", "gpt-4o"),
+    }
+
+
+def get_model_name() -> str:
+    # The Azure OpenAI deployment name, or the GitHub Models model name.
+    if get_api_host() == "azure":
+        return os.environ["AZURE_AI_CHAT_DEPLOYMENT"]
+    return os.getenv("GITHUB_MODEL", "gpt-4o")
+
+
+def get_chat_endpoint() -> str:
+    return os.environ["AZURE_AI_ENDPOINT"] if get_api_host() == "azure" else GITHUB_MODELS_ENDPOINT
+
+
+@functools.cache
+def _token_provider():
+    import azure.identity
+
+    return azure.identity.get_bearer_token_provider(azure.identity.DefaultAzureCredential(), TOKEN_SCOPE)
+
+
+def make_openai_client(
+    use_async: bool = False, api_version: str = AZURE_OPENAI_API_VERSION, max_retries: int | None = None
+):
+    """
+    New OpenAI client (sync or async) for the configured host: AzureOpenAI with an Azure AD token, or
+    OpenAI pointed at GitHub Models. Async clients bind to the event loop they are first used on,
+    so make one per loop. Pass `max_retries=0` when a rate limiter already retries the calls.
+    """
+    import openai
+
+    # Left unset, the client uses the openai package's default number of retries.
+    options = {} if max_retries is None else {"max_retries": max_retries}
+
+    if get_api_host() == "azure":
+        client_class = openai.AsyncAzureOpenAI if use_async else openai.AzureOpenAI
+        return client_class(
+            api_version=api_version,
+            azure_endpoint=os.environ["AZURE_AI_ENDPOINT"],
+            azure_ad_token_provider=_token_provider(),
+            **options,
+        )
+    client_class = openai.AsyncOpenAI if use_async else openai.OpenAI
+    return client_class(base_url=GITHUB_MODELS_ENDPOINT, api_key=os.environ["GITHUB_TOKEN"], **options)
+
+
+@functools.cache
+def get_openai_client():
+    """
+    Synchronous OpenAI client for the configured host, shared by every caller in the process.
+    """
+    return make_openai_client()
@@ -0,0 +1,100 @@
+# Non-blocking REST client for the Azure OpenAI chat completions endpoint, used by the gpt-4o target.
+# The gpt-4o callback was async but posted with the synchronous requests library, which blocks the
+# event loop, so simulated conversations ran one at a time. It also built a new token provider and
+# fetched a token on every call. This client sends requests on one keep-alive httpx.AsyncClient
+# connection pool and reuses a bearer token until shortly before it expires.
+# With an API key (e.g. for the local mock in mock_service.py), it sends that instead of a token.
+
+import asyncio
+import os
+import time
+
+import httpx
+from app_config import DEFAULT_POOL_SIZE
+
+TOKEN_SCOPE = "https://cognitiveservices.azure.com/.default"
+# Refresh tokens this many seconds before they expire, so in-flight requests never carry a stale one.
+TOKEN_REFRESH_MARGIN = int(os.getenv("AZURE_TOKEN_REFRESH_MARGIN", "300"))
+DEFAULT_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+# The first GA version that accepts stream_options, which streamed requests need to get their token usage.
+DEFAULT_API_VERSION = "2024-10-21"
+
+
+class CachedBearerToken:
+    """
+    Bearer token for `scope` shared by every request, fetched again only when it is about to expire.
+    Concurrent callers wait for a single refresh instead of each fetching their own token.
+    """
+
+    def __init__(self, credential, scope: str = TOKEN_SCOPE, refresh_margin: float = TOKEN_REFRESH_MARGIN):
+        self.credential = credential
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.refreshes = 0
+        self._token = None
+        self._lock: asyncio.Lock | None = None
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and self._token.expires_on - time.time() > self.refresh_margin
+
+    async def get(self) -> str:
+        if self._is_fresh():
+            return self._token.token
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._is_fresh():
+                # The credential is synchronous; fetch on a worker thread so the event loop keeps running.
+                self._token = await asyncio.to_thread(self.credential.get_token, self.scope)
+                self.refreshes += 1
+        return self._token.token
+
+
+class AzureOpenAIChatClient:
+    """
+    Posts chat completion requests to one Azure OpenAI deployment over a pooled async HTTP client.
+    The httpx client is created on first use, so it binds to the event loop that runs the requests.
+    Authenticates with `api_key` when given, otherwise with a bearer token from `credential`.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        deployment: str,
+        credential,
+        api_version: str = DEFAULT_API_VERSION,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        api_key: str | None = None,
+    ):
+        self.endpoint = endpoint
+        self.url = f"{endpoint}/openai/deployments/{deployment}/chat/completions?api-version={api_version}"
+        self.api_key = api_key
+        self.token = CachedBearerToken(credential)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=DEFAULT_TIMEOUT)
+        return self._client
+
+    async def post(self, data: dict, stream: bool = False) -> httpx.Response:
+        """
+        Send one chat completion request. With `stream`, the body of a successful response is left unread
+        for the caller to iterate (and close); error bodies are always read so `.json()` and `.text` work.
+        """
+        client = self._get_client()
+        if self.api_key:
+            headers = {"api-key": self.api_key}
+        else:
+            headers = {"Authorization": f"Bearer {await self.token.get()}"}
+        request = client.build_request("POST", self.url, json=data, headers=headers)
+        response = await client.send(request, stream=stream)
+        if stream and response.status_code != 200:
+            await response.aread()
+        return response
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,411 @@
+# Reproducible throughput benchmarks for the safety and quality evaluation pipelines.
+# Each case runs a real entry point against the local mock service (mock_service.py) with a fixed latency and seed:
+#   safety   run_safety_eval() of a safety_eval_<script>.py, with an in-process stand-in for the adversarial
+#            simulator; "--targets sync" uses the thread-wrapped call_completion path of the inference scripts
+#   quality  quality_eval_bulk.py's evaluators and evaluate() call, with its LLM judges answered by the mock
+# The suite sweeps dataset size, concurrency and streaming. Every case runs in a fresh subprocess, so the
+# process-wide rate limiters, usage tracker and tracer start empty and peak memory is per case.
+# Results (items/s, p95 latency, peak RSS) are saved as JSON; compare two runs with --compare BASE NEW.
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+from itertools import product
+from pathlib import Path
+
+import httpx
+from mock_service import MockBehavior, serve_in_background
+from rich.console import Console
+from rich.table import Table
+
+SAMPLES_DIR = Path(__file__).resolve().parent
+DEFAULT_RESULTS_PATH = SAMPLES_DIR / "benchmark-results.json"
+SAFETY_SCRIPTS = {
+    "gpt4o": "safety_eval_gpt4o.py",
+    "llama": "safety_eval_llama.py",
+    "ds": "safety_eval_ds.py",
+    "jamba": "safety_eval_jamba.py",
+}
+QUALITY_TESTDATA = SAMPLES_DIR / "quality-eval-testdata.jsonl"
+# Cases match across result files on these fields.
+CASE_FIELDS = ("suite", "script", "target", "items", "concurrency", "stream")
+# Relative change in items/s or p95 latency reported as a regression by --compare.
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+# The adaptive rate limiters are pinned to this rate by default, high enough that they never hold requests
+# back, so the concurrency sweep measures concurrency rather than how fast the limiters ramp up.
+DEFAULT_PINNED_RPS = 1000.0
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SAMPLES_DIR, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def benchmark_env(endpoint: str, concurrency: int, workdir: Path) -> dict[str, str]:
+    """
+    Environment for one case: every endpoint points at the mock service, with placeholder keys and project.
+    """
+    concurrency = str(concurrency)
+    return {
+        "AZURE_AI_ENDPOINT": endpoint,
+        "AZURE_AI_SAFETY_ENDPOINT": endpoint,
+        "AZURE_AI_PROJECT": "benchmark",
+        "AZURE_AI_CHAT_DEPLOYMENT": "gpt-4o",
+        "AZURE_AI_CHAT_MODEL": "gpt-4o",
+        "AZURE_AI_CHAT_API_KEY": "benchmark",
+        "AZURE_AI_API_KEY": "benchmark",
+        "AZURE_AI_API_KEY_LLAMA": "benchmark",
+        "AZURE_AI_MAX_CONCURRENCY": concurrency,
+        "AZURE_AI_EVAL_CONCURRENCY": concurrency,
+        # Worker threads for evaluate()'s batch run.
+        "PF_WORKER_COUNT": concurrency,
+        "API_HOST": "github",
+        "GITHUB_TOKEN": "benchmark",
+        "QUALITY_EVAL_CACHE": str(workdir / "judge-cache.sqlite"),
+    }
+
+
+class BenchmarkSimulator:
+    """
+    Stand-in for AdversarialSimulator: sends `max_simulation_results` numbered queries to the target,
+    at most `concurrent_async_task` at a time, and returns the conversations in the simulator's output format.
+    """
+
+    def __init__(self, **options):
+        pass
+
+    async def __call__(
+        self, *, target, max_simulation_results: int, concurrent_async_task: int = 3, randomization_seed=0, **options
+    ) -> list[dict]:
+        semaphore = asyncio.Semaphore(concurrent_async_task)
+
+        async def simulate_one(index: int) -> dict:
+            query = {"role": "user", "content": f"Benchmark query {randomization_seed}-{index}: what is the capital?"}
+            async with semaphore:
+                result = await target({"messages": [query]}, stream=False, session_state=None, context=None)
+            return {"template_parameters": {}, "messages": [query, result["messages"][-1]]}
+
+        return list(await asyncio.gather(*(simulate_one(index) for index in range(max_simulation_results))))
+
+
+def mock_judge(metric: str, endpoint: str):
+    """
+    Evaluator class standing in for an SDK judge such as RelevanceEvaluator: each call is one chat completion
+    against the mock service, and the result has the SDK's keys with a fixed score.
+    """
+
+    class MockJudge:
+        def __init__(self, model_config: dict):
+            self._client = httpx.Client(timeout=60.0)
+
+        def __call__(self, *, query: str, response: str, context: str | None = None) -> dict:
+            messages = [{"role": "user", "content": f"Rate the {metric} of: {query}\n{response}\n{context or ''}"}]
+            reply = self._client.post(f"{endpoint}/chat/completions", json={"messages": messages})
+            reply.raise_for_status()
+            usage = reply.json()["usage"]
+            return {
+                metric: 4.0,
+                f"{metric}_result": "pass",
+                f"{metric}_reason": "Benchmark score.",
+                f"{metric}_properties": {
+                    "prompt_tokens": usage["prompt_tokens"],
+                    "completion_tokens": usage["completion_tokens"],
+                },
+            }
+
+    # CachedJudge keys its cache on the evaluator's class name, which must differ per metric.
+    MockJudge.__name__ = MockJudge.__qualname__ = f"Mock{metric.title()}Evaluator"
+    return MockJudge
+
+
+def load_script(name: str, workdir: Path):
+    """
+    Import a copy of a sample script from `workdir`, so the files it writes next to itself land there.
+    """
+    path = Path(shutil.copy(SAMPLES_DIR / name, workdir / name))
+    spec = importlib.util.spec_from_file_location(f"benchmark_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_safety_case(case: dict, endpoint: str, env: dict, workdir: Path) -> dict:
+    module = load_script(SAFETY_SCRIPTS[case["script"]], workdir)
+    # The script loads .env on import, which may point elsewhere; the benchmark settings win.
+    os.environ.update(env)
+    module.AdversarialSimulator = BenchmarkSimulator
+    if case["script"] == "gpt4o":
+        from azure_openai_rest import AzureOpenAIChatClient
+
+        module.chat_client = AzureOpenAIChatClient(endpoint, env["AZURE_AI_CHAT_DEPLOYMENT"], None, api_key="benchmark")
+    options = {"use_async_target": case["target"] == "async"} if case["script"] != "gpt4o" else {}
+    start = time.perf_counter()
+    asyncio.run(
+        module.run_safety_eval(
+            max_simulations=case["items"],
+            eval_concurrency=case["concurrency"],
+            use_cache=False,
+            stream=case["stream"],
+            **options,
+        )
+    )
+    return {"wall_s": time.perf_counter() - start, "latency_stage": "target"}
+
+
+def run_quality_case(case: dict, endpoint: str, env: dict, workdir: Path) -> dict:
+    import quality_eval_bulk
+    from azure.ai.evaluation import evaluate
+    from quality_results import write_results
+
+    os.environ.update(env)
+    quality_eval_bulk.GroundednessEvaluator = mock_judge("groundedness", endpoint)
+    quality_eval_bulk.RelevanceEvaluator = mock_judge("relevance", endpoint)
+    quality_eval_bulk.DEFAULT_JUDGE_CACHE_PATH = workdir / "judge-cache.sqlite"
+    # Repeat the test data to the requested size, with distinct queries so no row is a judge cache hit.
+    rows = [json.loads(line) for line in QUALITY_TESTDATA.read_text().splitlines() if line.strip()]
+    data_path = workdir / "quality-benchmark-data.jsonl"
+    with open(data_path, "w") as f:
+        for index in range(case["items"]):
+            row = dict(rows[index % len(rows)])
+            row["query"] = f"{row['query']} (#{index})"
+            f.write(json.dumps(row) + "\n")
+    start = time.perf_counter()
+    result = evaluate(
+        data=str(data_path),
+        evaluators=quality_eval_bulk.build_evaluators(),
+        evaluator_config=quality_eval_bulk.EVALUATOR_CONFIG,
+    )
+    write_results(workdir / "quality-eval-results.jsonl", result["rows"], result["metrics"])
+    return {"wall_s": time.perf_counter() - start, "latency_stage": "quality_judge"}
+
+
+def run_case(case: dict, endpoint: str, result_path: Path):
+    """
+    Run one case in this process and write its measurements to `result_path`.
+    """
+    workdir = result_path.parent
+    env = benchmark_env(endpoint, case["concurrency"], workdir)
+    os.environ.update(env)
+    runner = run_safety_case if case["suite"] == "safety" else run_quality_case
+    measured = runner(case, endpoint, env, workdir)
+
+    from stage_tracing import tracer
+    from stream_metrics import streaming_stats
+    from usage_tracking import usage_tracker
+
+    stages = tracer.summary()
+    totals = usage_tracker.summary()["totals"]
+    latency = stages.get(measured["latency_stage"], {})
+    result = {
+        "items_per_s": case["items"] / measured["wall_s"],
+        "wall_s": measured["wall_s"],
+        "latency_p95_s": latency.get("p95"),
+        "stage_p95_s": {name: stats["p95"] for name, stats in stages.items()},
+        "calls": totals["calls"],
+        "errors": totals["errors"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if case["stream"]:
+        ttfts = [stats.get("ttft_p95") for stats in streaming_stats.summary().values()]
+        result["ttft_p95_s"] = max((ttft for ttft in ttfts if ttft is not None), default=None)
+    result_path.write_text(json.dumps(result))
+
+
+def build_cases(args) -> list[dict]:
+    cases = []
+    for items, concurrency in product(args.items, args.concurrency):
+        if "safety" in args.suite:
+            for script, target, stream in product(args.scripts, args.targets, args.stream):
+                if script == "gpt4o" and target == "sync":
+                    # The gpt-4o script has only the async REST target.
+                    continue
+                cases.append(
+                    {
+                        "suite": "safety",
+                        "script": script,
+                        "target": target,
+                        "items": items,
+                        "concurrency": concurrency,
+                        "stream": stream == "on",
+                    }
+                )
+        if "quality" in args.suite:
+            cases.append(
+                {
+                    "suite": "quality",
+                    "script": "quality_eval_bulk",
+                    "target": None,
+                    "items": items,
+                    "concurrency": concurrency,
+                    "stream": False,
+                }
+            )
+    return cases
+
+
+def run_suite(args) -> dict:
+    behavior = MockBehavior(latency=args.latency, token_delay=args.token_delay, seed=0)
+    server = serve_in_background(behavior)
+    console = Console()
+    child_env = dict(os.environ)
+    if args.adaptive_rate_limit:
+        rate_limiter = {"mode": "adaptive"}
+    else:
+        child_env["RATE_LIMIT_INITIAL_RPS"] = child_env["RATE_LIMIT_MAX_RPS"] = str(args.rate_limit_rps)
+        rate_limiter = {"mode": "pinned", "rps": args.rate_limit_rps}
+    results = []
+    try:
+        for case in build_cases(args):
+            with tempfile.TemporaryDirectory(prefix="benchmark-") as workdir:
+                result_path = Path(workdir) / "result.json"
+                console.print(f"Running {case_label(case)}")
+                completed = subprocess.run(
+                    [
+                        sys.executable,
+                        __file__,
+                        "--run-case",
+                        json.dumps(case),
+                        "--endpoint",
+                        server.url,
+                        "--result-file",
+                        str(result_path),
+                    ],
+                    cwd=workdir,
+                    env=child_env,
+                    capture_output=True,
+                    text=True,
+                )
+                if completed.returncode == 0 and result_path.exists():
+                    results.append({**case, **json.loads(result_path.read_text())})
+                else:
+                    console.print(f"[red]Case failed:[/red]\n{completed.stderr[-2000:]}")
+                    results.append({**case, "error": completed.stderr[-2000:]})
+    finally:
+        server.shutdown()
+    return {
+        "created": datetime.now(UTC).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": {"latency": args.latency, "token_delay": args.token_delay, "seed": 0},
+        "rate_limiter": rate_limiter,
+        "cases": results,
+    }
+
+
+def case_key(case: dict) -> tuple:
+    return tuple(case.get(field) for field in CASE_FIELDS)
+
+
+def case_label(case: dict) -> str:
+    parts = [case["suite"], case["script"] if case["suite"] == "safety" else None, case.get("target")]
+    parts += [f"n={case['items']}", f"c={case['concurrency']}", "stream" if case["stream"] else None]
+    return " ".join(part for part in parts if part)
+
+
+def relative_change(base: float | None, new: float | None) -> float | None:
+    if base is None or new is None or base == 0:
+        return None
+    return (new - base) / base
+
+
+def compare(base: dict, new: dict, threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> list[dict]:
+    """
+    Pair up the cases of two result files and flag those whose throughput fell or p95 latency rose
+    by more than `threshold`.
+    """
+    base_cases = {case_key(case): case for case in base["cases"] if "error" not in case}
+    rows = []
+    for case in new["cases"]:
+        before = base_cases.get(case_key(case))
+        if before is None or "error" in case:
+            continue
+        throughput = relative_change(before["items_per_s"], case["items_per_s"])
+        latency = relative_change(before["latency_p95_s"], case["latency_p95_s"])
+        rows.append(
+            {
+                **{field: case.get(field) for field in CASE_FIELDS},
+                "items_per_s": (before["items_per_s"], case["items_per_s"], throughput),
+                "latency_p95_s": (before["latency_p95_s"], case["latency_p95_s"], latency),
+                "peak_rss_mb": (before["peak_rss_mb"], case["peak_rss_mb"], None),
+                "regression": (throughput is not None and throughput < -threshold)
+                or (latency is not None and latency > threshold),
+            }
+        )
+    return rows
+
+
+def print_comparison(rows: list[dict]):
+    def cell(values: tuple) -> str:
+        before, after, change = values
+        text = f"{before:.3g} -> {after:.3g}" if before is not None and after is not None else "-"
+        return text if change is None else f"{text} ({change:+.1%})"
+
+    table = Table("case", "items/s", "p95 latency (s)", "peak RSS (MB)", "regression")
+    for row in rows:
+        table.add_row(
+            case_label(row),
+            cell(row["items_per_s"]),
+            cell(row["latency_p95_s"]),
+            cell(row["peak_rss_mb"]),
+            "[red]yes[/red]" if row["regression"] else "no",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the safety and quality pipelines against a mock backend.")
+    parser.add_argument("--suite", nargs="+", choices=["safety", "quality"], default=["safety", "quality"])
+    parser.add_argument("--scripts", nargs="+", choices=sorted(SAFETY_SCRIPTS), default=["llama"])
+    parser.add_argument("--targets", nargs="+", choices=["async", "sync"], default=["async"])
+    parser.add_argument("--items", nargs="+", type=int, default=[50, 200], help="Dataset sizes.")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[4, 16, 64])
+    parser.add_argument("--stream", nargs="+", choices=["off", "on"], default=["off", "on"])
+    parser.add_argument("--latency", default="fixed:50", help="Mock time to first byte (see mock_service.py).")
+    parser.add_argument("--token-delay", default="fixed:2", help="Mock delay between streamed chunks.")
+    parser.add_argument(
+        "--rate-limit-rps",
+        type=float,
+        default=DEFAULT_PINNED_RPS,
+        help="Rate the adaptive rate limiters are pinned to (default: %(default)s, never limiting).",
+    )
+    parser.add_argument(
+        "--adaptive-rate-limit",
+        action="store_true",
+        help="Let the rate limiters start and ramp up as in a real run instead of pinning them.",
+    )
+    parser.add_argument("--output", type=Path, default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("BASE", "NEW"), help="Diff two result files.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD)
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(json.loads(args.run_case), args.endpoint, args.result_file)
+    elif args.compare:
+        base_path, new_path = args.compare
+        comparison = compare(json.loads(base_path.read_text()), json.loads(new_path.read_text()), args.threshold)
+        print_comparison(comparison)
+        sys.exit(1 if any(row["regression"] for row in comparison) else 0)
+    else:
+        report = run_suite(args)
+        args.output.write_text(json.dumps(report, indent=4))
+        print(f"Wrote {len(report['cases'])} results to {args.output}")
@@ -0,0 +1,122 @@
+# One command-line entry point for the evaluation scripts, for schedulers and other repeated invocations:
+#   python cli.py safety {gpt4o,llama,ds,jamba,multi} [--max-simulations N] [--chunk-size N] [--resume] [--early-stop]
+#                        [--early-stop-threshold RATE] [--stream]
+#   python cli.py quality {bulk,custom}
+#   python cli.py probe {contentfilter,jailbreak}
+#   python cli.py sweep [--corpus prompts.jsonl] [--concurrency N] ...   (see probe_runner.py)
+# Only the standard library is imported at startup. Each subcommand imports its script, and with it the
+# Azure AI Evaluation SDK, azure.identity, openai or promptflow, only when it runs, so --help and argument
+# errors return immediately. Model and host settings are resolved once per process (see app_config.py).
+
+import argparse
+import importlib
+
+# Script module, default number of simulations and default batch size (None: unchunked) for each safety target,
+# as in each script's own __main__.
+SAFETY_SCRIPTS = {
+    "gpt4o": ("safety_eval_gpt4o", 10, None),
+    "llama": ("safety_eval_llama", 200, None),
+    "ds": ("safety_eval_ds", 200, None),
+    "jamba": ("safety_eval_jamba", 20, None),
+    "multi": ("safety_eval_multi", 200, None),
+}
+# Target names of safety_eval_multi.py, listed here so that --help does not have to import it.
+MULTI_MODELS = ["gpt4o", "llama", "deepseek", "jamba"]
+QUALITY_SCRIPTS = {"bulk": "quality_eval_bulk", "custom": "quality_eval_custom"}
+PROBE_SCRIPTS = {"contentfilter": "chat_error_contentfilter", "jailbreak": "chat_error_jailbreak"}
+
+
+def run_safety(args):
+    # Imported here because asyncio alone is a noticeable share of startup time.
+    import asyncio
+
+    module_name, default_simulations, default_chunk_size = SAFETY_SCRIPTS[args.target]
+    options = {
+        "max_simulations": default_simulations if args.max_simulations is None else args.max_simulations,
+        "resume": args.resume,
+        "early_stopping": args.early_stop,
+        "stream": args.stream,
+    }
+    # Left to early_stopping.py's EARLY_STOP_THRESHOLD default unless given.
+    if args.early_stop_threshold is not None:
+        options["early_stop_threshold"] = args.early_stop_threshold
+    if args.target == "multi":
+        if args.chunk_size:
+            raise SystemExit("--chunk-size does not apply to the multi target.")
+        options["models"] = args.models
+    else:
+        if args.models != MULTI_MODELS:
+            raise SystemExit("--models only applies to the multi target.")
+        chunk_size = default_chunk_size if args.chunk_size is None else args.chunk_size
+        # 0 runs unchunked.
+        options["chunk_size"] = chunk_size or None
+    module = importlib.import_module(module_name)
+    asyncio.run(module.run_safety_eval(**options))
+
+
+def run_quality(args):
+    importlib.import_module(QUALITY_SCRIPTS[args.evaluation]).main()
+
+
+def run_probe(args):
+    importlib.import_module(PROBE_SCRIPTS[args.probe]).main()
+
+
+def run_sweep(args):
+    importlib.import_module("probe_runner").main(args.options)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the quality and safety evaluation samples.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    safety = subcommands.add_parser("safety", help="Simulate adversarial queries and score the replies for safety.")
+    safety.add_argument("target", choices=list(SAFETY_SCRIPTS))
+    safety.add_argument("--max-simulations", type=int, help="Simulated queries (default: the script's own).")
+    safety.add_argument(
+        "--chunk-size", type=int, help="Simulate and score in batches of this size (default: the script's own, 0: off)."
+    )
+    safety.add_argument("--models", nargs="+", choices=MULTI_MODELS, default=MULTI_MODELS, help="Targets for multi.")
+    safety.add_argument("--resume", action="store_true", help="Skip items already scored in the journal.")
+    safety.add_argument(
+        "--early-stop", action="store_true", help="Stop once the pass-rate confidence intervals have converged."
+    )
+    safety.add_argument(
+        "--early-stop-threshold",
+        type=float,
+        help="With --early-stop, also stop once each pass-rate interval lies clearly above or below this rate.",
+    )
+    safety.add_argument(
+        "--stream", action="store_true", help="Stream replies and report time to first token and tokens per second."
+    )
+    safety.set_defaults(handler=run_safety)
+
+    quality = subcommands.add_parser("quality", help="Score answers with the LLM-judged quality evaluators.")
+    quality.add_argument("evaluation", choices=list(QUALITY_SCRIPTS))
+    quality.set_defaults(handler=run_quality)
+
+    probe = subcommands.add_parser("probe", help="Send a prompt that should trip the content filters.")
+    probe.add_argument("probe", choices=list(PROBE_SCRIPTS))
+    probe.set_defaults(handler=run_probe)
+
+    # Its options, including --help, are left for probe_runner.py to parse (see parse_args).
+    sweep = subcommands.add_parser(
+        "sweep", help="Send every prompt of a JSONL corpus and report content-filter rates.", add_help=False
+    )
+    sweep.set_defaults(handler=run_sweep)
+    return parser
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = build_parser()
+    args, unknown = parser.parse_known_args(argv)
+    if args.command == "sweep":
+        args.options = unknown
+    elif unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    return args
+
+
+if __name__ == "__main__":
+    cli_args = parse_args()
+    cli_args.handler(cli_args)
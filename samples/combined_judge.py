@@ -0,0 +1,103 @@
+# Single-call judge for the five built-in LLM quality metrics.
+# GroundednessEvaluator, RelevanceEvaluator, CoherenceEvaluator, FluencyEvaluator and
+# SimilarityEvaluator each make their own judge call on the same query/response/context/ground_truth,
+# so the response text is sent (and paid for) five times. The combined judge asks for all five scores
+# in one JSON-mode call to quality_judges.prompty and maps them back to the result keys each
+# evaluator returns. Metrics missing from or malformed in the reply are scored by the individual
+# evaluators instead.
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from judge_cache import model_identity
+from promptflow.client import load_flow
+from safety_cache import evaluator_version
+from usage_tracking import ROLE_QUALITY_JUDGE, usage_tracker
+
+METRICS = ("groundedness", "relevance", "coherence", "fluency", "similarity")
+# Inputs each individual evaluator is called with when the combined reply can't be used.
+FALLBACK_INPUTS = {
+    "groundedness": ("response", "context"),
+    "relevance": ("query", "response"),
+    "coherence": ("query", "response"),
+    "fluency": ("query", "response"),
+    "similarity": ("query", "response", "ground_truth"),
+}
+PROMPTY_PATH = Path(__file__).resolve().parent / "quality_judges.prompty"
+
+
+def result_keys(metric: str) -> tuple[str, ...]:
+    # The keys the SDK's prompty-based quality evaluators return, as recorded in quality-eval-results.jsonl.
+    return metric, f"gpt_{metric}", f"{metric}_reason"
+
+
+def metric_result(metric: str, score: float, reason: str) -> dict:
+    """
+    Build the result dict in the same layout as the SDK's prompty-based quality evaluators.
+    """
+    return {metric: score, f"gpt_{metric}": score, f"{metric}_reason": reason}
+
+
+def parse_metric(output: dict, metric: str) -> tuple[float, str] | None:
+    """
+    Return (score, reason) for one metric of the judge's reply, or None if it is missing or out of range.
+    """
+    item = output.get(metric)
+    if not isinstance(item, dict):
+        return None
+    try:
+        score = float(item.get("score"))
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= score <= 5:
+        return None
+    return score, str(item.get("reason", ""))
+
+
+class CombinedJudge:
+    """
+    Scores all five metrics in one judge call and returns {metric: evaluator-style result}, each with the
+    keys of result_keys(metric).
+    `fallback_evaluators` maps each metric to its individual evaluator (e.g. a CachedJudge around
+    GroundednessEvaluator) and is used only for metrics the combined reply does not cover.
+    """
+
+    def __init__(self, model_config: dict, fallback_evaluators: dict):
+        self.flow = load_flow(source=str(PROMPTY_PATH), model={"configuration": model_config})
+        self.model = model_identity(model_config)
+        self.fallback_evaluators = fallback_evaluators
+        self.fallbacks = 0
+        # Changes whenever the prompt or the result layout does, so cached combined results are not reused
+        # across those edits.
+        digest = hashlib.sha256(PROMPTY_PATH.read_bytes() + repr(result_keys("metric")).encode("utf-8"))
+        self.version = f"{evaluator_version()}-{digest.hexdigest()[:12]}"
+
+    def __call__(self, *, query: str, response: str, context: str, ground_truth: str) -> dict[str, dict]:
+        inputs = {"query": query, "response": response, "context": context, "ground_truth": ground_truth}
+        try:
+            # The flow returns only the parsed reply, so the usage summary gets the call's latency but no tokens.
+            with usage_tracker.track(ROLE_QUALITY_JUDGE, self.model):
+                output = self.flow(**inputs)
+            if isinstance(output, str):
+                output = json.loads(output)
+        except Exception as e:
+            logging.warning(f"Combined judge call failed ({e}); using the individual evaluators.")
+            output = {}
+        if not isinstance(output, dict):
+            output = {}
+        results = {}
+        for metric in METRICS:
+            parsed = parse_metric(output, metric)
+            if parsed is None:
+                if output:
+                    logging.warning(f"Combined judge gave no valid {metric} score; using the {metric} evaluator.")
+                self.fallbacks += 1
+                evaluator = self.fallback_evaluators[metric]
+                result = evaluator(**{name: inputs[name] for name in FALLBACK_INPUTS[metric]})
+                # Newer SDK versions add more keys; keep one layout for every metric of a result.
+                results[metric] = {key: result[key] for key in result_keys(metric) if key in result}
+            else:
+                results[metric] = metric_result(metric, *parsed)
+        return results
@@ -0,0 +1,10 @@
+# Short content digests used to identify prompts and replies in journals and result files without
+# storing the text itself. Kept free of other dependencies so lightweight scripts can import it.
+
+import hashlib
+
+
+def text_digest(text: str | None) -> str | None:
+    if text is None:
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,80 @@
+# Sequential early stopping for safety evaluation runs.
+# A fixed max_simulations budget is mostly wasted on models that pass 98-100% of the time: the
+# pass rate is pinned down long before the last simulation. The estimator tracks a Wilson score
+# confidence interval on the pass rate of each harm category as items are scored, and reports
+# that the run can stop once every interval is narrow enough or lies clearly on one side of the
+# pass-rate threshold.
+
+import math
+import os
+from statistics import NormalDist
+
+from safety_scoring import EVALUATORS, PASSING_SEVERITIES
+
+DEFAULT_CONFIDENCE = float(os.getenv("EARLY_STOP_CONFIDENCE", "0.95"))
+DEFAULT_TARGET_WIDTH = float(os.getenv("EARLY_STOP_WIDTH", "0.05"))
+DEFAULT_MIN_SAMPLES = int(os.getenv("EARLY_STOP_MIN_SAMPLES", "30"))
+# Pass rate that matters for the verdict, e.g. 0.95; unset, runs stop only once the intervals are narrow enough.
+DEFAULT_THRESHOLD = float(os.environ["EARLY_STOP_THRESHOLD"]) if os.getenv("EARLY_STOP_THRESHOLD") else None
+
+
+def wilson_interval(passes: int, n: int, z: float) -> tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    p = passes / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class PassRateEstimator:
+    """
+    Online pass-rate estimate with a confidence interval for each harm category.
+    Skipped items count as scored but not passing, matching how summary_scores computes pass_rate.
+    `min_samples` guards against stopping on a lucky start, since the intervals are checked after every item.
+    """
+
+    def __init__(
+        self,
+        confidence: float = DEFAULT_CONFIDENCE,
+        target_width: float = DEFAULT_TARGET_WIDTH,
+        threshold: float | None = DEFAULT_THRESHOLD,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+    ):
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.target_width = target_width
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.count = 0
+        self.pass_counts = {evaluator: 0 for evaluator in EVALUATORS}
+
+    def update(self, scores: dict | None):
+        self.count += 1
+        if scores is None:
+            return
+        for evaluator in EVALUATORS:
+            if scores[evaluator] in PASSING_SEVERITIES:
+                self.pass_counts[evaluator] += 1
+
+    def interval(self, evaluator: str) -> tuple[float, float]:
+        return wilson_interval(self.pass_counts[evaluator], self.count, self.z)
+
+    def is_settled(self, evaluator: str) -> bool:
+        low, high = self.interval(evaluator)
+        if high - low <= self.target_width:
+            return True
+        # The whole interval is on one side of the threshold, so more samples will not change the verdict.
+        return self.threshold is not None and (low >= self.threshold or high < self.threshold)
+
+    def should_stop(self) -> bool:
+        return self.count >= self.min_samples and all(self.is_settled(evaluator) for evaluator in EVALUATORS)
+
+    def report(self) -> dict:
+        return {
+            evaluator: {
+                "pass_rate": self.pass_counts[evaluator] / self.count if self.count else 0,
+                "interval": [round(bound, 4) for bound in self.interval(evaluator)],
+            }
+            for evaluator in EVALUATORS
+        } | {"scored": self.count}
@@ -0,0 +1,148 @@
+# Native async target for the Azure AI Inference safety evaluation scripts.
+# Wrapping the synchronous client in asyncio.to_thread ties every in-flight request to an OS thread
+# and caps concurrency at the default thread pool size. This target awaits the
+# azure.ai.inference.aio client directly, so hundreds of concurrent queries only cost coroutines.
+
+import asyncio
+import logging
+import os
+from typing import Any
+
+from azure.ai.inference.aio import ChatCompletionsClient
+from azure.ai.inference.models import AssistantMessage, SystemMessage, UserMessage
+from azure.core.credentials import AzureKeyCredential
+from rate_limit import get_limiter
+from safety_scoring import APP_ERROR_MESSAGE, CONTENT_FILTER_MESSAGE
+from stream_metrics import StreamTimer, streaming_stats
+from usage_tracking import ROLE_TARGET, usage_tracker
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("AZURE_AI_MAX_CONCURRENCY", "32"))
+
+
+def convert_message(message: dict) -> Any:
+    """
+    Convert a message dictionary to the proper type for the Azure AI Inference SDK chat API.
+    Expects the dictionary to have keys "role" and "content".
+    """
+    role = message.get("role")
+    content = message.get("content")
+    if role == "system":
+        return SystemMessage(content=content)
+    elif role == "user":
+        return UserMessage(content=content)
+    elif role == "assistant":
+        return AssistantMessage(content=content)
+    else:
+        raise ValueError(f"Unknown role: {role}")
+
+
+class AsyncChatTarget:
+    """
+    Simulator target that calls a chat model through the async Azure AI Inference client.
+    `max_concurrency` bounds the number of requests in flight; pass it to the AdversarialSimulator
+    as `concurrent_async_task` so the simulator keeps the target saturated.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        api_key: str,
+        model_name: str,
+        temperature: float,
+        top_p: float,
+        max_tokens: int = 2048,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.endpoint = endpoint
+        self.model_name = model_name
+        self.temperature = temperature
+        self.top_p = top_p
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self._credential = AzureKeyCredential(api_key)
+        self._client: ChatCompletionsClient | None = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Shared with every other caller of this endpoint; retries 429s and transient errors.
+        self.limiter = get_limiter(endpoint)
+
+    def _get_client(self) -> ChatCompletionsClient:
+        # Created lazily so the underlying HTTP session binds to the running event loop.
+        if self._client is None:
+            # No SDK retries: the limiter retries throttled and failed calls, and needs to see every 429.
+            self._client = ChatCompletionsClient(endpoint=self.endpoint, credential=self._credential, retry_total=0)
+        return self._client
+
+    async def _request(self, messages: list, stream: bool) -> dict:
+        """
+        Send one request and read the reply. Each attempt the limiter makes is tracked as its own call, so the
+        recorded latency covers the request alone, not the wait for a concurrency slot, pacing or backoff.
+        """
+        client = self._get_client()
+        with usage_tracker.track(ROLE_TARGET, self.model_name) as call:
+            timer = StreamTimer()
+            response = await timer.timed(client.complete)(
+                stream=stream,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                top_p=self.top_p,
+                presence_penalty=0.0,
+                frequency_penalty=0.0,
+                model=self.model_name,
+            )
+            if stream:
+                async for update in response:
+                    if update.choices:
+                        timer.add(update.choices[0].delta.content)
+                    if update.usage:
+                        call.set_response(update)
+                        timer.completion_tokens = call.usage["completion_tokens"]
+                streaming_stats.record(self.model_name, timer)
+                return {"role": "assistant", "content": timer.content}
+            call.set_response(response)
+            return {"role": "assistant", "content": response.choices[0].message.content}
+
+    async def complete(self, messages: list, stream: bool) -> dict:
+        """
+        Call the chat completion API and return the assistant's message.
+        Content filter errors and other failures fall back to the same canned replies as call_completion.
+        Token usage and latency are recorded in the shared usage tracker, and streamed replies are timed
+        (time to first token, inter-token gaps, tokens per second) in the shared streaming stats.
+        """
+        try:
+            async with self._semaphore:
+                return await self.limiter.run_async(self._request, messages, stream)
+        except Exception as e:
+            if "content_filter" in str(e):
+                return dict(CONTENT_FILTER_MESSAGE)
+            logging.warning(f"Request failed with error: {e}")
+            return dict(APP_ERROR_MESSAGE)
+
+    async def __call__(
+        self,
+        input: dict,
+        stream: bool = False,
+        session_state: Any = None,
+        context: dict[str, Any] | None = None,
+    ):
+        messages = [convert_message(m) for m in input["messages"]]
+        result_message = await self.complete(messages, stream)
+        return {
+            "messages": input["messages"] + [result_message],
+            "stream": stream,
+            "session_state": session_state,
+            "context": context,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,65 @@
+# Shared Azure AI Inference clients for the safety evaluation scripts.
+# Building a new ChatCompletionsClient for every simulated query pays for a TLS handshake and
+# connection setup on each call, so the scripts borrow long-lived clients from this pool instead.
+
+import hashlib
+import threading
+
+import requests
+from app_config import DEFAULT_POOL_SIZE
+from azure.ai.inference import ChatCompletionsClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import RequestsTransport
+from requests.adapters import HTTPAdapter
+
+
+class ChatClientPool:
+    """
+    Hands out one ChatCompletionsClient per (endpoint, API key) pair.
+    Each client is backed by a keep-alive HTTP session holding up to `pool_size` connections,
+    so concurrent callbacks reuse open connections instead of reconnecting.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1.")
+        self.pool_size = pool_size
+        self._clients: dict[tuple[str, str], ChatCompletionsClient] = {}
+        self._sessions: list[requests.Session] = []
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str, api_key: str) -> ChatCompletionsClient:
+        # Key on a digest of the API key so the secret itself is not kept around as a dict key.
+        key = (endpoint, hashlib.sha256(api_key.encode()).hexdigest())
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                client = ChatCompletionsClient(
+                    endpoint=endpoint,
+                    credential=AzureKeyCredential(api_key),
+                    transport=RequestsTransport(session=session, session_owner=False),
+                    # The callers' rate limiter retries throttled and failed calls, and needs to see every 429.
+                    retry_total=0,
+                )
+                self._clients[key] = client
+                self._sessions.append(session)
+            return client
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            for session in self._sessions:
+                session.close()
+            self._clients.clear()
+            self._sessions.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,61 @@
+# Cache for the LLM-judged quality evaluators (Groundedness, Relevance, Coherence, ...).
+# Re-running a quality script on a dataset re-asks the judge about rows that have not changed.
+# Judge results are stored in the same SQLite LRU store as the safety verdicts, keyed on the
+# evaluator, the judge model or deployment from model_config, and the normalized inputs,
+# so only new or edited rows cost judge tokens.
+
+import inspect
+import json
+import os
+from pathlib import Path
+
+from safety_cache import VerdictCache, evaluator_version
+
+DEFAULT_JUDGE_CACHE_PATH = Path(
+    os.getenv("QUALITY_EVAL_CACHE", Path(__file__).resolve().parent / ".quality-eval-cache.sqlite")
+)
+
+
+def model_identity(model_config: dict) -> str:
+    # Azure configs name a deployment, OpenAI-compatible configs (GitHub Models) name a model.
+    return model_config.get("azure_deployment") or model_config.get("model") or "unknown"
+
+
+def normalize_inputs(inputs: dict) -> str:
+    """
+    Serialize evaluator inputs so that whitespace-only differences map to the same cache key.
+    """
+
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [normalize(item) for item in value]
+        return value
+
+    return json.dumps(normalize(inputs), sort_keys=True, default=str)
+
+
+class CachedJudge:
+    """
+    Wraps an LLM-judged evaluator so repeated inputs are answered from the local cache.
+    Keeps the wrapped evaluator's call signature, which `evaluate()` uses for column mapping.
+    """
+
+    def __init__(self, evaluator, model_config: dict, cache: VerdictCache, version: str | None = None):
+        self.evaluator = evaluator
+        self.cache = cache
+        self.name = type(inspect.unwrap(evaluator)).__name__
+        self.model = model_identity(model_config)
+        self.version = version or evaluator_version()
+        self.__signature__ = inspect.signature(evaluator)
+
+    def __call__(self, **inputs) -> dict:
+        key = VerdictCache.make_key(self.name, self.version, self.model, normalize_inputs(inputs))
+        result = self.cache.get(key)
+        if result is None:
+            result = self.evaluator(**inputs)
+            self.cache.put(key, result)
+        return result
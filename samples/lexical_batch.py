@@ -0,0 +1,362 @@
+# Batch scoring for the lexical (non-LLM) evaluators used in quality_eval_other_builtins.py.
+# F1ScoreEvaluator, RougeScoreEvaluator, BleuScoreEvaluator, MeteorScoreEvaluator and
+# GleuScoreEvaluator each tokenize and count n-grams again for every row in pure Python. This
+# module tokenizes each text once per tokenizer and counts n-grams for the whole batch at once with
+# NumPy, then applies the same formulas as the SDK (and the NLTK and rouge_score code it uses) in
+# the same order, so every score matches the per-row evaluator exactly. LexicalScorer scores single
+# pairs with the same formulas from analyses shared through lexical_cache.AnalysisCache.
+
+import math
+import re
+import string
+from collections import defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+from azure.ai.evaluation import RougeType
+
+# Private SDK helpers, imported so the tokens match the evaluators' exactly. They can change in any SDK release,
+# which is why requirements.txt pins azure-ai-evaluation to one minor version.
+from azure.ai.evaluation._common.utils import nltk_tokenize
+from azure.ai.evaluation._vendor.rouge_score import tokenize as rouge_tokenize
+from lexical_cache import AnalysisCache
+from nltk.translate.meteor_score import meteor_score
+
+BLEU_MAX_ORDER = 4
+GLEU_MAX_ORDER = 4
+# Constant k of NLTK's SmoothingFunction, used by method4 smoothing in BleuScoreEvaluator.
+BLEU_SMOOTHING_K = 5
+ARTICLES_RE = re.compile(r"\b(a|an|the)\b")
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+
+def f1_tokenize(text: str) -> list[str]:
+    # Same normalization as F1ScoreEvaluator: lowercase, drop punctuation and articles, split on whitespace.
+    return ARTICLES_RE.sub(" ", text.lower().translate(PUNCTUATION_TABLE)).split()
+
+
+def rouge_tokens(text: str) -> list[str]:
+    # RougeScorer's default tokenizer, without stemming.
+    return rouge_tokenize.tokenize(text, None)
+
+
+# BLEU, GLEU and METEOR all use the SDK's NLTK tokenization (which also fetches the NLTK data METEOR needs).
+TOKENIZERS = {"f1": f1_tokenize, "rouge": rouge_tokens, "nltk": nltk_tokenize}
+
+
+class Vocabulary:
+    """
+    Maps tokens to integer ids so token sequences can be compared as NumPy arrays.
+    """
+
+    def __init__(self):
+        # A token seen for the first time gets the next free id.
+        self.ids: defaultdict[str, int] = defaultdict()
+        self.ids.default_factory = self.ids.__len__
+
+    def encode(self, tokens: list[str]) -> np.ndarray:
+        return np.fromiter(map(self.ids.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+
+
+def tokenize_batch(
+    texts: Sequence[str], kind: str, vocabulary: Vocabulary, cache: AnalysisCache | None = None
+) -> list[np.ndarray]:
+    """
+    Tokenize and encode every text with the tokenizer named `kind`, tokenizing repeated texts only once.
+    With a `cache`, texts already analyzed by earlier calls are not tokenized again.
+    """
+    tokenizer = TOKENIZERS[kind]
+    encoded: dict[str, np.ndarray] = {}
+    for text in texts:
+        if text not in encoded:
+            tokens = cache.analyze(kind, text, tokenizer).tokens if cache is not None else tokenizer(text)
+            encoded[text] = vocabulary.encode(tokens)
+    return [encoded[text] for text in texts]
+
+
+def ngram_overlaps(
+    hypotheses: list[np.ndarray], references: list[np.ndarray], max_n: int
+) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    For each (hypothesis, reference) pair and each n from 1 to `max_n`, count the n-grams they share
+    (each n-gram counted at most as often as it occurs on either side) and the total n-grams on each side.
+    Returns one (matches, hypothesis_totals, reference_totals) tuple of integer arrays per n.
+    """
+    rows = len(hypotheses)
+    sequences = list(hypotheses) + list(references)
+    lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+    flat = np.concatenate(sequences) if lengths.sum() else np.empty(0, dtype=np.int64)
+    sequence = np.repeat(np.arange(len(sequences)), lengths)
+    # Tokens left in the sequence from each position on, including the token itself.
+    remaining = np.repeat(np.cumsum(lengths), lengths) - np.arange(len(flat))
+    vocabulary_size = int(flat.max()) + 1 if len(flat) else 1
+    positions = np.arange(len(flat))
+    codes = flat
+    overlaps = []
+    for n in range(1, max_n + 1):
+        if n > 1:
+            # Extend every (n-1)-gram that has room by the token after it, then renumber the n-grams densely
+            # so the codes stay small enough to combine with a row index in one int64.
+            keep = remaining[positions] >= n
+            positions = positions[keep]
+            pairs = codes[keep] * vocabulary_size + flat[positions + n - 1]
+            _, codes = np.unique(pairs, return_inverse=True)
+            codes = codes.reshape(-1)
+        row = sequence[positions] % max(rows, 1)
+        is_hypothesis = sequence[positions] < rows
+        hyp_totals = np.bincount(row[is_hypothesis], minlength=rows)
+        ref_totals = np.bincount(row[~is_hypothesis], minlength=rows)
+        matches = np.zeros(rows, dtype=np.int64)
+        if len(codes):
+            distinct = int(codes.max()) + 1
+            keys = row * distinct + codes
+            hyp_keys, hyp_counts = np.unique(keys[is_hypothesis], return_counts=True)
+            ref_keys, ref_counts = np.unique(keys[~is_hypothesis], return_counts=True)
+            shared, hyp_index, ref_index = np.intersect1d(hyp_keys, ref_keys, assume_unique=True, return_indices=True)
+            clipped = np.minimum(hyp_counts[hyp_index], ref_counts[ref_index])
+            matches = np.bincount(shared // distinct, weights=clipped, minlength=rows).astype(np.int64)
+        overlaps.append((matches, hyp_totals, ref_totals))
+    return overlaps
+
+
+def lcs_length(a: np.ndarray, b: np.ndarray) -> int:
+    """
+    Length of the longest common subsequence of two token or id sequences (bit-parallel algorithm).
+    """
+    if len(a) == 0 or len(b) == 0:
+        return 0
+    if isinstance(a, np.ndarray):
+        a, b = a.tolist(), b.tolist()
+    positions: dict = {}
+    for index, token in enumerate(a):
+        positions[token] = positions.get(token, 0) | (1 << index)
+    mask = (1 << len(a)) - 1
+    v = mask
+    for token in b:
+        u = v & positions.get(token, 0)
+        v = ((v + u) | (v - u)) & mask
+    return len(a) - v.bit_count()
+
+
+def _fmeasure(precision: float, recall: float) -> float:
+    # rouge_score.scoring.fmeasure
+    if precision + recall > 0:
+        return 2 * precision * recall / (precision + recall)
+    return 0.0
+
+
+def _f1_score(common: int, hyp_len: int, ref_len: int) -> float:
+    # F1ScoreEvaluator._compute_f1_score
+    if common == 0:
+        return 0.0
+    precision = 1.0 * common / hyp_len
+    recall = 1.0 * common / ref_len
+    return (2.0 * precision * recall) / (precision + recall)
+
+
+def _gleu_score(matches: int, hyp_total: int, ref_total: int) -> float:
+    # nltk sentence_gleu: shared 1- to 4-grams over the larger of the two n-gram totals.
+    n_all = max(hyp_total, ref_total)
+    return matches / n_all if n_all > 0 else 0.0
+
+
+def _bleu_score(numerators: list[int], denominators: list[int], hyp_len: int, ref_len: int) -> float:
+    # nltk sentence_bleu with one reference, uniform weights and SmoothingFunction().method4.
+    if numerators[0] == 0:
+        return 0
+    if hyp_len > ref_len:
+        brevity_penalty = 1
+    elif hyp_len == 0:
+        brevity_penalty = 0
+    else:
+        brevity_penalty = math.exp(1 - ref_len / hyp_len)
+    p_n = []
+    increment = 1
+    for numerator, denominator in zip(numerators, denominators):
+        if numerator == 0 and hyp_len > 1:
+            p_n.append(1 / (2**increment * BLEU_SMOOTHING_K / math.log(hyp_len)) / denominator)
+            increment += 1
+        else:
+            p_n.append(numerator / denominator if numerator else 0)
+    weight = 1 / BLEU_MAX_ORDER
+    return brevity_penalty * math.exp(math.fsum(weight * math.log(p_i) for p_i in p_n if p_i > 0))
+
+
+def _rouge_scores(
+    rouge_type: str, responses, ground_truths, vocabulary: Vocabulary, cache: AnalysisCache | None
+) -> dict[str, np.ndarray]:
+    rows = len(responses)
+    hypotheses = tokenize_batch(responses, "rouge", vocabulary, cache)
+    references = tokenize_batch(ground_truths, "rouge", vocabulary, cache)
+    precision, recall, f1_score = np.zeros(rows), np.zeros(rows), np.zeros(rows)
+    if rouge_type == RougeType.ROUGE_L:
+        for i, (hypothesis, reference) in enumerate(zip(hypotheses, references)):
+            if len(hypothesis) and len(reference):
+                lcs = lcs_length(reference, hypothesis)
+                p, r = lcs / len(hypothesis), lcs / len(reference)
+                precision[i], recall[i], f1_score[i] = p, r, _fmeasure(p, r)
+    else:
+        n = int(rouge_type.removeprefix("rouge"))
+        matches, hyp_totals, ref_totals = ngram_overlaps(hypotheses, references, n)[n - 1]
+        for i, (common, hyp_total, ref_total) in enumerate(
+            zip(matches.tolist(), hyp_totals.tolist(), ref_totals.tolist())
+        ):
+            p, r = common / max(hyp_total, 1), common / max(ref_total, 1)
+            precision[i], recall[i], f1_score[i] = p, r, _fmeasure(p, r)
+    return {"rouge_precision": precision, "rouge_recall": recall, "rouge_f1_score": f1_score}
+
+
+def score_lexical_batch(
+    responses: Sequence[str],
+    ground_truths: Sequence[str],
+    rouge_type: RougeType = RougeType.ROUGE_1,
+    meteor_alpha: float = 0.9,
+    meteor_beta: float = 3.0,
+    meteor_gamma: float = 0.5,
+    cache: AnalysisCache | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Score every (response, ground_truth) pair with the five lexical metrics and return one array per metric:
+    f1_score, rouge_precision, rouge_recall, rouge_f1_score, bleu_score, meteor_score and gleu_score.
+    Each value equals what the corresponding evaluator returns for that row. METEOR depends on WordNet
+    synonym matching, which does not vectorize; it is still computed per row, but from the shared tokens.
+    Pass a `cache` to reuse tokens, stems and synsets across batches (e.g. a fixed set of ground truths).
+    """
+    if len(responses) != len(ground_truths):
+        raise ValueError("responses and ground_truths must have the same length.")
+    rows = len(responses)
+    vocabulary = Vocabulary()
+
+    f1_hypotheses = tokenize_batch(responses, "f1", vocabulary, cache)
+    f1_references = tokenize_batch(ground_truths, "f1", vocabulary, cache)
+    matches, hyp_totals, ref_totals = (counts.tolist() for counts in ngram_overlaps(f1_hypotheses, f1_references, 1)[0])
+    results = {"f1_score": np.array([_f1_score(*row) for row in zip(matches, hyp_totals, ref_totals)], dtype=float)}
+
+    results |= _rouge_scores(rouge_type, responses, ground_truths, vocabulary, cache)
+
+    if cache is None:
+        cache = AnalysisCache()
+    hypotheses = tokenize_batch(responses, "nltk", vocabulary, cache)
+    references = tokenize_batch(ground_truths, "nltk", vocabulary, cache)
+    # Per n: (matches, hypothesis totals, reference totals) as plain lists for the per-row formulas below.
+    overlaps = [
+        [counts.tolist() for counts in overlap]
+        for overlap in ngram_overlaps(hypotheses, references, max(BLEU_MAX_ORDER, GLEU_MAX_ORDER))
+    ]
+
+    bleu = np.zeros(rows)
+    gleu = np.zeros(rows)
+    for i in range(rows):
+        hyp_len, ref_len = len(hypotheses[i]), len(references[i])
+        matches = [overlap[0][i] for overlap in overlaps]
+        hyp_totals = [overlap[1][i] for overlap in overlaps]
+        ref_totals = [overlap[2][i] for overlap in overlaps]
+        bleu[i] = _bleu_score(
+            matches[:BLEU_MAX_ORDER], [max(1, total) for total in hyp_totals[:BLEU_MAX_ORDER]], hyp_len, ref_len
+        )
+        gleu[i] = _gleu_score(
+            sum(matches[:GLEU_MAX_ORDER]), sum(hyp_totals[:GLEU_MAX_ORDER]), sum(ref_totals[:GLEU_MAX_ORDER])
+        )
+    results["bleu_score"] = bleu
+    results["gleu_score"] = gleu
+
+    results["meteor_score"] = np.array(
+        [
+            _meteor_score(
+                cache,
+                cache.analyze("nltk", response, nltk_tokenize).tokens,
+                cache.analyze("nltk", truth, nltk_tokenize).tokens,
+                meteor_alpha,
+                meteor_beta,
+                meteor_gamma,
+            )
+            for response, truth in zip(responses, ground_truths)
+        ],
+        dtype=float,
+    )
+    return results
+
+
+def _meteor_score(
+    cache: AnalysisCache, hypothesis: list[str], reference: list[str], alpha: float, beta: float, gamma: float
+) -> float:
+    # MeteorScoreEvaluator, with stems and synsets memoized in the cache.
+    return meteor_score(
+        [reference], hypothesis, stemmer=cache.stemmer, wordnet=cache.wordnet, alpha=alpha, beta=beta, gamma=gamma
+    )
+
+
+class LexicalScorer:
+    """
+    Scores one (response, ground_truth) pair at a time with all five lexical metrics, drawing every
+    text's tokens and n-grams from a shared AnalysisCache. Returns the same values as the evaluators.
+    Comparing many responses against one ground truth analyzes the ground truth only once.
+    """
+
+    def __init__(
+        self,
+        cache: AnalysisCache | None = None,
+        rouge_type: RougeType = RougeType.ROUGE_1,
+        meteor_alpha: float = 0.9,
+        meteor_beta: float = 3.0,
+        meteor_gamma: float = 0.5,
+    ):
+        self.cache = cache if cache is not None else AnalysisCache()
+        self.rouge_type = rouge_type
+        self.rouge_n = 0 if rouge_type == RougeType.ROUGE_L else int(rouge_type.removeprefix("rouge"))
+        self.meteor_alpha = meteor_alpha
+        self.meteor_beta = meteor_beta
+        self.meteor_gamma = meteor_gamma
+
+    def _analyze(self, kind: str, response: str, ground_truth: str, max_n: int):
+        tokenizer = TOKENIZERS[kind]
+        return (
+            self.cache.analyze(kind, response, tokenizer, max_n),
+            self.cache.analyze(kind, ground_truth, tokenizer, max_n),
+        )
+
+    def __call__(self, *, response: str, ground_truth: str) -> dict[str, float]:
+        hypothesis, reference = self._analyze("f1", response, ground_truth, 1)
+        scores = {
+            "f1_score": _f1_score(
+                _overlap(hypothesis.ngrams[1], reference.ngrams[1]), len(hypothesis.tokens), len(reference.tokens)
+            )
+        }
+
+        hypothesis, reference = self._analyze("rouge", response, ground_truth, self.rouge_n)
+        if self.rouge_type == RougeType.ROUGE_L:
+            if hypothesis.tokens and reference.tokens:
+                lcs = lcs_length(reference.tokens, hypothesis.tokens)
+                precision, recall = lcs / len(hypothesis.tokens), lcs / len(reference.tokens)
+            else:
+                precision, recall = 0, 0
+        else:
+            hyp_ngrams, ref_ngrams = hypothesis.ngrams[self.rouge_n], reference.ngrams[self.rouge_n]
+            common = _overlap(hyp_ngrams, ref_ngrams)
+            precision = common / max(hyp_ngrams.total(), 1)
+            recall = common / max(ref_ngrams.total(), 1)
+        scores |= {"rouge_precision": precision, "rouge_recall": recall, "rouge_f1_score": _fmeasure(precision, recall)}
+
+        max_n = max(BLEU_MAX_ORDER, GLEU_MAX_ORDER)
+        hypothesis, reference = self._analyze("nltk", response, ground_truth, max_n)
+        matches = [_overlap(hypothesis.ngrams[n], reference.ngrams[n]) for n in range(1, max_n + 1)]
+        hyp_totals = [hypothesis.ngrams[n].total() for n in range(1, max_n + 1)]
+        ref_totals = [reference.ngrams[n].total() for n in range(1, max_n + 1)]
+        hyp_len, ref_len = len(hypothesis.tokens), len(reference.tokens)
+        scores["bleu_score"] = _bleu_score(
+            matches[:BLEU_MAX_ORDER], [max(1, total) for total in hyp_totals[:BLEU_MAX_ORDER]], hyp_len, ref_len
+        )
+        scores["gleu_score"] = _gleu_score(
+            sum(matches[:GLEU_MAX_ORDER]), sum(hyp_totals[:GLEU_MAX_ORDER]), sum(ref_totals[:GLEU_MAX_ORDER])
+        )
+        scores["meteor_score"] = _meteor_score(
+            self.cache, hypothesis.tokens, reference.tokens, self.meteor_alpha, self.meteor_beta, self.meteor_gamma
+        )
+        return scores
+
+
+def _overlap(hyp_ngrams, ref_ngrams) -> int:
+    # Shared n-grams, each counted at most as often as it occurs on either side.
+    if len(hyp_ngrams) > len(ref_ngrams):
+        hyp_ngrams, ref_ngrams = ref_ngrams, hyp_ngrams
+    return sum(min(count, ref_ngrams[ngram]) for ngram, count in hyp_ngrams.items() if ngram in ref_ngrams)
@@ -0,0 +1,125 @@
+# Shared per-text analysis for the lexical evaluators (F1, ROUGE, BLEU, GLEU, METEOR).
+# Scored one at a time, each evaluator tokenizes the same response and ground truth and builds
+# its own n-grams. Comparing one ground truth against many candidate responses repeats the same
+# reference work for every candidate. The cache keeps each text's tokens and n-gram multisets
+# (per tokenizer) and METEOR's stems and WordNet lookups in memory, within a fixed memory budget,
+# so every text is analyzed once no matter how many evaluators or comparisons use it.
+
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+from nltk.corpus import wordnet
+from nltk.stem.porter import PorterStemmer
+
+DEFAULT_MAX_BYTES = int(os.getenv("LEXICAL_CACHE_MB", "256")) * 1024 * 1024
+DEFAULT_MAX_WORDS = 100_000
+# Rough per-entry overhead of a Counter slot plus its tuple key, used for the memory estimate.
+NGRAM_ENTRY_BYTES = 120
+
+
+class TextAnalysis:
+    """
+    Tokens of one text under one tokenizer, plus its n-gram multisets for n = 1..max_n.
+    """
+
+    def __init__(self, tokens: list[str], max_n: int = 0):
+        self.tokens = tokens
+        self.ngrams = {n: Counter(zip(*(tokens[i:] for i in range(n)))) for n in range(1, max_n + 1)}
+        self.nbytes = (
+            sys.getsizeof(tokens)
+            + sum(sys.getsizeof(token) for token in tokens)
+            + sum(len(counts) * NGRAM_ENTRY_BYTES for counts in self.ngrams.values())
+        )
+
+    @property
+    def max_n(self) -> int:
+        return len(self.ngrams)
+
+
+class AnalysisCache:
+    """
+    Least-recently-used store of TextAnalysis objects keyed by (tokenizer name, text), bounded by an
+    estimate of the memory they hold, plus memoized METEOR stems and synsets. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_words: int = DEFAULT_MAX_WORDS):
+        self.max_bytes = max_bytes
+        self.max_words = max_words
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple[str, str], TextAnalysis] = OrderedDict()
+        self._lock = threading.Lock()
+        # The same stemmer and WordNet reader meteor_score uses by default, memoized per word.
+        self.stemmer = MemoizedStemmer(PorterStemmer(), max_words)
+        self.wordnet = MemoizedWordNet(wordnet, max_words)
+
+    def analyze(self, kind: str, text: str, tokenizer, max_n: int = 0) -> TextAnalysis:
+        """
+        Return the analysis of `text` by the tokenizer registered as `kind`, with n-grams up to `max_n`.
+        """
+        key = (kind, text)
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None and analysis.max_n >= max_n:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return analysis
+            self.misses += 1
+        tokens = analysis.tokens if analysis is not None else tokenizer(text)
+        analysis = TextAnalysis(tokens, max_n)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes + sys.getsizeof(text)
+            self._entries[key] = analysis
+            self.nbytes += analysis.nbytes + sys.getsizeof(text)
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                (_, old_text), old = self._entries.popitem(last=False)
+                self.nbytes -= old.nbytes + sys.getsizeof(old_text)
+                self.evictions += 1
+        return analysis
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "megabytes": round(self.nbytes / 1024 / 1024, 2),
+            }
+
+
+class MemoizedStemmer:
+    """
+    Stemmer with a bounded per-word memo; drop-in for the `stemmer` argument of nltk's meteor_score.
+    """
+
+    def __init__(self, stemmer, maxsize: int = DEFAULT_MAX_WORDS):
+        self.stem = lru_cache(maxsize=maxsize)(stemmer.stem)
+
+
+class MemoizedWordNet:
+    """
+    WordNet reader with a bounded per-word memo of synsets; drop-in for the `wordnet` argument of nltk's meteor_score.
+    """
+
+    def __init__(self, wordnet, maxsize: int = DEFAULT_MAX_WORDS):
+        self._wordnet = wordnet
+        # Resolve wordnet.synsets on first use; touching nltk's lazy corpus loader loads WordNet from disk.
+        self._synsets = lru_cache(maxsize=maxsize)(lambda lemma: self._wordnet.synsets(lemma))
+
+    def synsets(self, lemma, *args, **kwargs):
+        if args or kwargs:
+            return self._wordnet.synsets(lemma, *args, **kwargs)
+        return self._synsets(lemma)
+
+    def __getattr__(self, name):
+        return getattr(self._wordnet, name)
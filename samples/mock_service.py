@@ -0,0 +1,373 @@
+# Local stand-in for the chat completion and safety scoring services, for load tests without network access.
+# One stdlib HTTP server answers:
+#   POST .../chat/completions          Azure AI Inference (ChatCompletionsClient) and Azure OpenAI
+#                                      (/openai/deployments/<name>/chat/completions) wire formats,
+#                                      including streamed server-sent events
+#   POST /safety/evaluate              per-category harm severities in ContentSafetyEvaluator's result layout
+#   GET  /stats                        request and outcome counts
+# Latency is drawn from a configurable distribution, and a configurable share of requests fail with 500,
+# are throttled with 429 + Retry-After, or are blocked with a content_filter error.
+# Point the scripts at it with AZURE_AI_ENDPOINT (chat targets) and AZURE_AI_SAFETY_ENDPOINT (safety scoring).
+# The Azure OpenAI target also needs AZURE_AI_CHAT_API_KEY (any value), so no Azure token is requested.
+# The adversarial simulator itself still runs against Azure.
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import httpx
+from rate_limit import raise_for_transient_status
+from safety_scoring import EVALUATORS
+
+DEFAULT_PORT = 8765
+REPLIES = [
+    "I'm sorry, but I can't help with that request.",
+    "Here is some general, safe information on the topic you asked about.",
+    "That is an interesting question. Let me give you a short, balanced overview of the main points.",
+    "I can't assist with that, but I'm happy to help with something else.",
+]
+CONTENT_FILTER_ERROR = {
+    "error": {
+        "code": "content_filter",
+        "message": "The response was filtered due to the prompt triggering the content management policy.",
+        "param": "prompt",
+        "status": 400,
+        "innererror": {
+            "code": "ResponsibleAIPolicyViolation",
+            "content_filter_result": {
+                "hate": {"filtered": False, "severity": "safe"},
+                "jailbreak": {"filtered": True, "detected": True},
+                "self_harm": {"filtered": False, "severity": "safe"},
+                "sexual": {"filtered": False, "severity": "safe"},
+                "violence": {"filtered": True, "severity": "medium"},
+            },
+        },
+    }
+}
+SEVERITY_SCORES = {"Very low": 0, "Medium": 4}
+
+
+class LatencyModel:
+    """
+    Latency distribution in seconds, parsed from "fixed:MS", "uniform:MIN_MS,MAX_MS" or "lognormal:MEDIAN_MS,SIGMA".
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        values = [float(value) for value in args.split(",")] if args else []
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(
+                f"Invalid latency spec {spec!r}: use fixed:MS, uniform:MIN_MS,MAX_MS or lognormal:MEDIAN_MS,SIGMA"
+            )
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            milliseconds = self.values[0]
+        elif self.kind == "uniform":
+            milliseconds = rng.uniform(*self.values)
+        else:
+            median, sigma = self.values
+            milliseconds = rng.lognormvariate(math.log(median), sigma)
+        return milliseconds / 1000
+
+
+class MockBehavior:
+    """
+    How the mock service responds: latencies, failure rates and a seeded random source shared by all requests.
+    """
+
+    def __init__(
+        self,
+        latency: str = "lognormal:300,0.5",
+        token_delay: str = "fixed:15",
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        content_filter_rate: float = 0.0,
+        unsafe_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int | None = None,
+    ):
+        if error_rate + throttle_rate + content_filter_rate > 1:
+            raise ValueError("error_rate + throttle_rate + content_filter_rate must not exceed 1.")
+        self.latency = LatencyModel(latency)
+        self.token_delay = LatencyModel(token_delay)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.content_filter_rate = content_filter_rate
+        self.unsafe_rate = unsafe_rate
+        self.retry_after = retry_after
+        self.counts: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self, can_filter: bool) -> tuple[str, float]:
+        """
+        Pick the outcome of one request ("ok", "error", "throttled" or "content_filter") and its latency.
+        """
+        with self._lock:
+            roll = self._rng.random()
+            latency = self.latency.sample(self._rng)
+        if roll < self.error_rate:
+            outcome = "error"
+        elif roll < self.error_rate + self.throttle_rate:
+            outcome = "throttled"
+        elif can_filter and roll < self.error_rate + self.throttle_rate + self.content_filter_rate:
+            outcome = "content_filter"
+        else:
+            outcome = "ok"
+        self.count(outcome)
+        return outcome, latency
+
+    def next_token_delay(self) -> float:
+        with self._lock:
+            return self.token_delay.sample(self._rng)
+
+    def count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+def severity(text: str, category: str, unsafe_rate: float) -> str:
+    # Deterministic per (category, text), so repeated runs and cached verdicts agree.
+    digest = hashlib.sha256(f"{category}\n{text}".encode()).digest()
+    return "Medium" if int.from_bytes(digest[:8], "big") / 2**64 < unsafe_rate else "Very low"
+
+
+def pick_reply(messages: list) -> str:
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).digest()
+    return REPLIES[digest[0] % len(REPLIES)]
+
+
+def count_tokens(messages: list) -> int:
+    return sum(len(str(message.get("content") or "").split()) for message in messages)
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def behavior(self) -> MockBehavior:
+        return self.server.behavior
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_failure(self, outcome: str) -> bool:
+        if outcome == "error":
+            self._send_json(500, {"error": {"code": "InternalServerError", "message": "Mock server error."}})
+        elif outcome == "throttled":
+            self._send_json(
+                429,
+                {"error": {"code": "429", "message": "Rate limit exceeded (mock)."}},
+                {"Retry-After": str(self.behavior.retry_after)},
+            )
+        elif outcome == "content_filter":
+            self._send_json(400, CONTENT_FILTER_ERROR)
+        else:
+            return False
+        return True
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            self._send_json(200, self.behavior.stats())
+        else:
+            self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = urlparse(self.path).path
+        if path.endswith("/chat/completions"):
+            self.behavior.count("chat_requests")
+            self._chat_completion(body, path)
+        elif path == "/safety/evaluate":
+            self.behavior.count("safety_requests")
+            self._safety_evaluation(body)
+        else:
+            self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+
+    def _chat_completion(self, body: dict, path: str):
+        outcome, latency = self.behavior.draw(can_filter=True)
+        time.sleep(latency)
+        if self._send_failure(outcome):
+            return
+        messages = body.get("messages", [])
+        model = body.get("model") or "mock-model"
+        words = pick_reply(messages).split(" ")
+        usage = {
+            "prompt_tokens": count_tokens(messages),
+            "completion_tokens": len(words),
+            "total_tokens": count_tokens(messages) + len(words),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if not body.get("stream"):
+            choice = {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": " ".join(words)}}
+            self._send_json(
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [choice],
+                    "usage": usage,
+                },
+            )
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, word in enumerate(words):
+            if index:
+                time.sleep(self.behavior.next_token_delay())
+            delta = {"role": "assistant", "content": word} if index == 0 else {"content": " " + word}
+            self._write_event(completion_id, model, [{"index": 0, "delta": delta, "finish_reason": None}])
+        self._write_event(completion_id, model, [{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        # Like the real services: Azure OpenAI only sends the usage chunk when the request asks for it,
+        # Azure AI Inference endpoints always send it.
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        if include_usage or not path.startswith("/openai/"):
+            self._write_event(completion_id, model, [], usage=usage)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, completion_id: str, model: str, choices: list, usage: dict | None = None):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": choices,
+        }
+        if usage is not None:
+            chunk["usage"] = usage
+        self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def _write_chunk(self, data: bytes):
+        # HTTP/1.1 chunked transfer encoding; an empty chunk ends the body.
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _safety_evaluation(self, body: dict):
+        outcome, latency = self.behavior.draw(can_filter=False)
+        time.sleep(latency)
+        if self._send_failure(outcome):
+            return
+        text = f"{body.get('query', '')}\n{body.get('response', '')}"
+        result = {}
+        for category in EVALUATORS:
+            label = severity(text, category, self.behavior.unsafe_rate)
+            result[category] = label
+            result[f"{category}_score"] = SEVERITY_SCORES[label]
+            result[f"{category}_reason"] = f"Mock severity for {category}."
+        self._send_json(200, result)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for many simultaneous connections from concurrent load tests.
+    request_queue_size = 256
+
+    def __init__(self, address: tuple[str, int], behavior: MockBehavior):
+        super().__init__(address, MockRequestHandler)
+        self.behavior = behavior
+
+    def handle_error(self, request, client_address):
+        # Clients that exit with keep-alive connections still open are routine under load, not errors.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def serve_in_background(behavior: MockBehavior | None = None, host: str = "127.0.0.1", port: int = 0) -> MockServer:
+    """
+    Start the mock service on a daemon thread (port 0 picks a free port) and return it; call shutdown() to stop.
+    """
+    server = MockServer((host, port), behavior or MockBehavior())
+    threading.Thread(target=server.serve_forever, name="mock-service", daemon=True).start()
+    return server
+
+
+class MockSafetyEvaluator:
+    """
+    Stand-in for ContentSafetyEvaluator that scores through the mock service's /safety/evaluate endpoint.
+    Throttled and failed requests raise TransientError, so RateLimited retries them like the real service's.
+    """
+
+    def __init__(self, endpoint: str, pool_size: int = 32):
+        self.url = endpoint.rstrip("/") + "/safety/evaluate"
+        self._client = httpx.Client(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size), timeout=60.0
+        )
+
+    def __call__(self, *, query: str, response: str) -> dict:
+        http_response = self._client.post(self.url, json={"query": query, "response": response})
+        raise_for_transient_status(http_response)
+        http_response.raise_for_status()
+        return http_response.json()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the chat completion and safety services.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", default="lognormal:300,0.5", help="Time to first byte, e.g. uniform:100,500.")
+    parser.add_argument("--token-delay", default="fixed:15", help="Delay between streamed chunks.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail with 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests throttled with 429.")
+    parser.add_argument("--content-filter-rate", type=float, default=0.0, help="Share of chat requests filtered.")
+    parser.add_argument("--unsafe-rate", type=float, default=0.0, help="Share of replies scored Medium severity.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s.")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    mock_behavior = MockBehavior(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        content_filter_rate=args.content_filter_rate,
+        unsafe_rate=args.unsafe_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    mock_server = MockServer((args.host, args.port), mock_behavior)
+    print(f"Mock service listening on {mock_server.url} (Ctrl+C to stop)")
+    try:
+        mock_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock_server.server_close()
+        print(f"Request counts: {mock_behavior.stats()}")
@@ -0,0 +1,218 @@
+# Concurrent content-filter probes over a corpus of red-team prompts.
+# chat_error_jailbreak.py and chat_error_contentfilter.py each send one prompt and print one line. This runner
+# reads prompts from a JSONL file as it goes and sends up to `max_concurrency` at once with the async OpenAI
+# client, paced by the endpoint's adaptive rate limiter. It classifies each outcome from the error's
+# innererror.content_filter_result (or a completion stopped by the filter): jailbreak filtered, other filter,
+# answered, or error. Each prompt's record is appended to the results file as soon as it finishes, and the
+# outcome counts and rates are written as the last record, even when the run is interrupted.
+# Model replies are not saved, as they may contain disturbing content.
+#
+# Corpus rows: {"id": ..., "prompt": "..."} or {"id": ..., "messages": [...]}, optionally with a "system" prompt.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+import openai
+from app_config import get_chat_endpoint, get_model_name, make_openai_client
+from digests import text_digest
+from quality_results import ResultsWriter
+from rate_limit import get_limiter
+from rich.progress import Progress
+from usage_tracking import ROLE_TARGET, usage_tracker
+
+DEFAULT_CONCURRENCY = int(os.getenv("PROBE_RUNNER_CONCURRENCY", "32"))
+
+OUTCOME_JAILBREAK = "jailbreak_filtered"
+OUTCOME_FILTERED = "content_filtered"
+OUTCOME_ANSWERED = "answered"
+OUTCOME_ERROR = "error"
+OUTCOMES = (OUTCOME_JAILBREAK, OUTCOME_FILTERED, OUTCOME_ANSWERED, OUTCOME_ERROR)
+
+
+def filtered_categories(content_filter_result: dict | None) -> list[str]:
+    # e.g. {"jailbreak": {"filtered": true, "detected": true}, "violence": {"filtered": false, ...}}
+    return sorted(
+        name
+        for name, result in (content_filter_result or {}).items()
+        if isinstance(result, dict) and result.get("filtered") is True
+    )
+
+
+def classify_filter_result(content_filter_result: dict | None, stage: str) -> dict:
+    categories = filtered_categories(content_filter_result)
+    jailbreak = "jailbreak" in categories
+    return {
+        "outcome": OUTCOME_JAILBREAK if jailbreak else OUTCOME_FILTERED,
+        "stage": stage,
+        "filtered_categories": categories,
+    }
+
+
+def classify_error(error: Exception) -> dict | None:
+    """
+    Outcome of a request rejected by the content filter, or None for any other error.
+    """
+    if getattr(error, "code", None) != "content_filter":
+        return None
+    body = error.body if isinstance(getattr(error, "body", None), dict) else {}
+    inner = body.get("innererror") or {}
+    return classify_filter_result(inner.get("content_filter_result"), stage="prompt")
+
+
+def classify_response(response) -> dict:
+    """
+    Outcome of a completed request: answered, or stopped by the filter on the completion.
+    """
+    choice = response.choices[0] if response.choices else None
+    if choice is not None and choice.finish_reason == "content_filter":
+        # Azure OpenAI adds the per-category results to each choice.
+        return classify_filter_result(getattr(choice, "content_filter_results", None), stage="completion")
+    return {"outcome": OUTCOME_ANSWERED, "stage": None, "filtered_categories": []}
+
+
+def corpus_messages(row: dict, system_prompt: str | None) -> list[dict]:
+    messages = row.get("messages") or [{"role": "user", "content": row["prompt"]}]
+    system = row.get("system", system_prompt)
+    if system and messages[0].get("role") != "system":
+        messages = [{"role": "system", "content": system}] + messages
+    return messages
+
+
+class ProbeRunner:
+    """
+    Sends every prompt of a corpus to one chat model with bounded concurrency and tallies the outcomes.
+    """
+
+    def __init__(
+        self,
+        client,
+        model_name: str,
+        limiter,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        system_prompt: str | None = None,
+        max_tokens: int = 256,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.client = client
+        self.model_name = model_name
+        self.limiter = limiter
+        self.max_concurrency = max_concurrency
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.counts: Counter = Counter()
+        self.category_counts: Counter = Counter()
+
+    async def probe(self, messages: list[dict]) -> dict:
+        """
+        Send one prompt and classify the outcome. Errors other than content filtering are raised.
+        """
+        with usage_tracker.track(ROLE_TARGET, self.model_name) as call:
+            try:
+                response = await self.limiter.run_async(
+                    self.client.chat.completions.create,
+                    model=self.model_name,
+                    messages=messages,
+                    max_tokens=self.max_tokens,
+                )
+            except openai.APIStatusError as e:
+                outcome = classify_error(e)
+                if outcome is None:
+                    raise
+                return outcome
+            call.set_response(response)
+        return classify_response(response)
+
+    async def probe_row(self, line: int, row: dict) -> dict:
+        start = time.perf_counter()
+        record = {"line": line, "id": row.get("id")}
+        try:
+            messages = corpus_messages(row, self.system_prompt)
+            record["prompt_digest"] = text_digest(messages[-1].get("content"))
+            record.update(await self.probe(messages))
+        except Exception as e:
+            record.update(outcome=OUTCOME_ERROR, stage=None, filtered_categories=[], error=str(e))
+        record["latency"] = time.perf_counter() - start
+        return record
+
+    def summary(self) -> dict:
+        total = sum(self.counts.values())
+        return {
+            "prompts": total,
+            "counts": {outcome: self.counts[outcome] for outcome in OUTCOMES},
+            "rates": {outcome: self.counts[outcome] / total if total else 0 for outcome in OUTCOMES},
+            # Rejected prompts only, not counting errors: how often the filter stopped a red-team prompt.
+            "filter_rate": (self.counts[OUTCOME_JAILBREAK] + self.counts[OUTCOME_FILTERED]) / total if total else 0,
+            "filtered_categories": dict(self.category_counts.most_common()),
+        }
+
+    async def run(self, corpus_path: Path, output_path: Path) -> dict:
+        """
+        Probe every prompt of `corpus_path`, appending a record per prompt to `output_path` as it finishes,
+        then the summary. Only about 2 x max_concurrency corpus rows are held in memory at a time.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.max_concurrency)
+        complete = False
+
+        with ResultsWriter(output_path) as writer, Progress() as progress:
+            task = progress.add_task(f"Probing {self.model_name} with {corpus_path.name}...", total=None)
+
+            async def worker():
+                while (item := await queue.get()) is not None:
+                    record = await self.probe_row(*item)
+                    writer.write_row(record)
+                    self.counts[record["outcome"]] += 1
+                    self.category_counts.update(record["filtered_categories"])
+                    progress.advance(task)
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.max_concurrency)]
+            try:
+                with open(corpus_path, encoding="utf-8") as f:
+                    for line, text in enumerate(f):
+                        if text.strip():
+                            await queue.put((line, json.loads(text)))
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+                complete = True
+            finally:
+                for worker_task in workers:
+                    worker_task.cancel()
+                # Also written for an interrupted run, covering the prompts that finished.
+                writer.write_metrics(self.summary(), row_count=writer.row_count, complete=complete)
+        return self.summary()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Send a JSONL corpus of prompts and report content-filter rates.")
+    parser.add_argument("--corpus", type=Path, default=Path(__file__).resolve().parent / "probe-corpus.jsonl")
+    parser.add_argument("--output", type=Path, help="Results file (defaults to <corpus name>-probe-results.jsonl).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--system", help="System prompt for rows that do not have their own.")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    runner = ProbeRunner(
+        # Async OpenAI client for Azure or GitHub Models (see app_config.py). The rate limiter does the
+        # retrying, so the client's own retries are turned off rather than multiplying the attempts.
+        make_openai_client(use_async=True, max_retries=0),
+        get_model_name(),
+        get_limiter(get_chat_endpoint()),
+        max_concurrency=args.concurrency,
+        system_prompt=args.system,
+        max_tokens=args.max_tokens,
+    )
+    output_path = args.output or Path(f"{args.corpus.stem}-probe-results.jsonl")
+    summary = asyncio.run(runner.run(args.corpus, output_path))
+    logging.warning(f"Token usage: {usage_tracker.summary()['totals']}")
+    print(f"Probed {summary['prompts']} prompts: {summary['rates']} (results in {output_path})")
+
+
+if __name__ == "__main__":
+    main()
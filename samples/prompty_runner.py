@@ -0,0 +1,243 @@
+# Dataset runner for prompty-based custom evaluators such as friendliness.prompty.
+# quality_eval_custom.py scores one hard-coded response with load_flow, which re-renders the prompt
+# and creates a new OpenAI client on every call. This runner parses the prompty file and compiles
+# its template once, streams rows from a JSONL file, and sends judge calls through one async client
+# with bounded concurrency (and the shared adaptive rate limiter). With --pack-size N, N rows are
+# scored by a single judge call that returns one JSON result per item; items missing from a packed
+# reply are rescored one by one. Each scored row is appended to the results file as soon as it is done.
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+from pathlib import Path
+
+import jinja2
+from app_config import get_chat_endpoint, get_model_name, make_openai_client
+from quality_results import MetricsAccumulator, ResultsWriter
+from rate_limit import get_limiter
+from rich.progress import Progress
+from ruamel.yaml import YAML
+from usage_tracking import ROLE_QUALITY_JUDGE, usage_tracker
+
+DEFAULT_CONCURRENCY = int(os.getenv("PROMPTY_RUNNER_CONCURRENCY", "8"))
+SAMPLES_DIR = Path(__file__).resolve().parent
+FRONT_MATTER_RE = re.compile(r"-{3,}\n(.*?)-{3,}\n(.*)", re.DOTALL)
+# Same role separators as prompty's chat parser: a role name alone on a line, optionally after "#".
+ROLE_RE = re.compile(r"^\s*#?\s*(system|user|assistant|function)\s*:\s*\n", re.IGNORECASE | re.MULTILINE)
+JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class CompiledPrompty:
+    """
+    A prompty file parsed once: its declared inputs and outputs, model parameters and compiled template.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        match = FRONT_MATTER_RE.search(self.path.read_text(encoding="utf-8"))
+        if not match:
+            raise ValueError(f"{self.path} is not a prompty file: expected YAML front matter between --- lines.")
+        config, template = match.groups()
+        config = YAML(typ="safe").load(config) or {}
+        self.name = self.path.stem
+        self.inputs = list(config.get("inputs", {}))
+        self.outputs = list(config.get("outputs", {}))
+        self.parameters = config.get("model", {}).get("parameters", {}) or {}
+        self.template = jinja2.Template(template, trim_blocks=True, keep_trailing_newline=True)
+
+    def messages(self, **inputs) -> list[dict]:
+        rendered = self.template.render(**inputs)
+        # re.split with one group yields [preamble, role, content, role, content, ...].
+        parts = ROLE_RE.split(rendered)
+        return [
+            {"role": role.lower(), "content": content.strip()}
+            for role, content in zip(parts[1::2], parts[2::2])
+            if content.strip()
+        ]
+
+    def packed_messages(self, rows: list[dict]) -> list[dict]:
+        """
+        Messages that ask for the outputs of every row in one reply, keyed by item id.
+        """
+        messages = self.messages(**{name: f"(the {name} of each item in ITEMS below)" for name in self.inputs})
+        items = [{"id": index} | {name: row.get(name) for name in self.inputs} for index, row in enumerate(rows)]
+        fields = ", ".join(f'"{name}": ...' for name in self.outputs)
+        messages[-1]["content"] += (
+            "\n\nScore each of the following ITEMS independently, exactly as you would score a single one.\n"
+            f"ITEMS: {json.dumps(items, ensure_ascii=False)}\n"
+            f'Respond with a JSON object {{"results": [{{"id": <item id>, {fields}}}, ...]}} with one entry per item.'
+        )
+        return messages
+
+    def parse_output(self, content: str) -> dict:
+        """
+        Read the declared output fields from a JSON reply (tolerating text around the JSON object).
+        """
+        try:
+            output = json.loads(content)
+        except json.JSONDecodeError:
+            match = JSON_OBJECT_RE.search(content or "")
+            if not match:
+                raise ValueError(f"Reply is not JSON: {content!r}")
+            output = json.loads(match.group())
+        return self.select_outputs(output)
+
+    def select_outputs(self, output) -> dict:
+        if not isinstance(output, dict):
+            raise ValueError(f"Expected a JSON object, got {output!r}")
+        if not self.outputs:
+            return output
+        missing = [name for name in self.outputs if name not in output]
+        if missing:
+            raise ValueError(f"Reply is missing outputs {missing}: {output!r}")
+        return {name: output[name] for name in self.outputs}
+
+
+class PromptyRunner:
+    """
+    Scores dataset rows with a compiled prompty using one shared async OpenAI-compatible client.
+    """
+
+    def __init__(
+        self,
+        prompty: CompiledPrompty,
+        client,
+        model_name: str,
+        limiter,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+        pack_size: int = 1,
+    ):
+        if pack_size < 1:
+            raise ValueError("pack_size must be at least 1.")
+        self.prompty = prompty
+        self.client = client
+        self.model_name = model_name
+        self.limiter = limiter
+        self.max_concurrency = max_concurrency
+        self.pack_size = pack_size
+        self.calls = 0
+        self.repacked = 0
+
+    async def _complete(self, messages: list[dict], json_mode: bool) -> str:
+        parameters = dict(self.prompty.parameters)
+        if json_mode:
+            parameters["response_format"] = {"type": "json_object"}
+        self.calls += 1
+        with usage_tracker.track(ROLE_QUALITY_JUDGE, self.model_name) as call:
+            response = await self.limiter.run_async(
+                self.client.chat.completions.create, model=self.model_name, messages=messages, **parameters
+            )
+            call.set_response(response)
+        return response.choices[0].message.content
+
+    async def score_row(self, row: dict) -> dict:
+        inputs = {name: row.get(name) for name in self.prompty.inputs}
+        json_mode = "response_format" in self.prompty.parameters
+        return self.prompty.parse_output(await self._complete(self.prompty.messages(**inputs), json_mode))
+
+    async def score_pack(self, rows: list[dict]) -> list[dict | Exception]:
+        """
+        Score several rows with one judge call. Rows the packed reply does not cover are scored individually.
+        """
+        if len(rows) == 1:
+            return [await self._score_or_error(rows[0])]
+        results: list[dict | Exception | None] = [None] * len(rows)
+        try:
+            reply = json.loads(await self._complete(self.prompty.packed_messages(rows), json_mode=True))
+            for item in reply.get("results", []):
+                index = item.get("id") if isinstance(item, dict) else None
+                if isinstance(index, int) and 0 <= index < len(rows) and results[index] is None:
+                    try:
+                        results[index] = self.prompty.select_outputs(item)
+                    except ValueError:
+                        pass
+        except Exception as e:
+            logging.warning(f"Packed judge call for {len(rows)} rows failed ({e}); scoring them one by one.")
+        for index, result in enumerate(results):
+            if result is None:
+                self.repacked += 1
+                results[index] = await self._score_or_error(rows[index])
+        return results
+
+    async def _score_or_error(self, row: dict) -> dict | Exception:
+        try:
+            return await self.score_row(row)
+        except Exception as e:
+            return e
+
+    def make_row(self, line: int, row: dict, result: dict | Exception) -> dict:
+        # Same flat layout as evaluate() rows, so quality_results.iter_rows() can read the results.
+        record = {"line": line} | {f"inputs.{name}": row.get(name) for name in self.prompty.inputs}
+        if isinstance(result, Exception):
+            return record | {f"outputs.{self.prompty.name}.error": str(result)}
+        return record | {f"outputs.{self.prompty.name}.{name}": value for name, value in result.items()}
+
+    async def run(self, data_path: Path, output_path: Path) -> dict:
+        """
+        Score every row of `data_path`, appending results to `output_path` as they finish, and return the metrics.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.max_concurrency)
+        metrics = MetricsAccumulator()
+        errors = 0
+
+        with ResultsWriter(output_path) as writer, Progress() as progress:
+            task = progress.add_task(f"Scoring with {self.prompty.path.name}...", total=None)
+
+            async def worker():
+                nonlocal errors
+                while (pack := await queue.get()) is not None:
+                    lines, rows = zip(*pack)
+                    for line, row, result in zip(lines, rows, await self.score_pack(list(rows))):
+                        record = self.make_row(line, row, result)
+                        writer.write_row(record)
+                        metrics.add_row(record)
+                        errors += isinstance(result, Exception)
+                        progress.advance(task)
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.max_concurrency)]
+            try:
+                with open(data_path, encoding="utf-8") as f:
+                    rows = ((line, json.loads(text)) for line, text in enumerate(f) if text.strip())
+                    while pack := list(itertools.islice(rows, self.pack_size)):
+                        await queue.put(pack)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker_task in workers:
+                    worker_task.cancel()
+            result = metrics.result()
+            writer.write_metrics(result, row_count=writer.row_count, errors=errors, judge_calls=self.calls)
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a JSONL dataset with a prompty-based evaluator.")
+    parser.add_argument("--prompty", type=Path, default=SAMPLES_DIR / "friendliness.prompty")
+    parser.add_argument("--data", type=Path, default=SAMPLES_DIR / "quality-eval-testdata.jsonl")
+    parser.add_argument("--output", type=Path, help="Results file (defaults to samples/<prompty name>-results.jsonl).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--pack-size", type=int, default=1, help="Rows scored per judge call.")
+    args = parser.parse_args()
+
+    # Async OpenAI client for Azure or GitHub Models (see app_config.py). The rate limiter does the
+    # retrying, so the client's own retries are turned off rather than multiplying the attempts.
+    client = make_openai_client(use_async=True, api_version="2024-08-01-preview", max_retries=0)
+
+    prompty = CompiledPrompty(args.prompty)
+    runner = PromptyRunner(
+        prompty,
+        client,
+        get_model_name(),
+        get_limiter(get_chat_endpoint()),
+        max_concurrency=args.concurrency,
+        pack_size=args.pack_size,
+    )
+    output_path = args.output or SAMPLES_DIR / f"{prompty.name}-results.jsonl"
+    metrics = asyncio.run(runner.run(args.data, output_path))
+    usage_tracker.write_summary(output_path.with_name(f"quality-eval-usage-{prompty.name}.json"))
+    print(f"Scored {args.data} with {runner.calls} judge calls ({runner.repacked} rows rescored alone): {metrics}")
@@ -1,63 +1,86 @@
-import os
+import argparse
+from pathlib import Path
 
-import azure.identity
 import rich
+from app_config import get_model_config
 from azure.ai.evaluation import (
-    AzureOpenAIModelConfiguration,
     CoherenceEvaluator,
     FluencyEvaluator,
     GroundednessEvaluator,
-    OpenAIModelConfiguration,
     RelevanceEvaluator,
     SimilarityEvaluator,
 )
-from dotenv import load_dotenv
+from combined_judge import CombinedJudge
+from judge_cache import DEFAULT_JUDGE_CACHE_PATH, CachedJudge, model_identity
+from safety_cache import VerdictCache
+from usage_tracking import ROLE_QUALITY_JUDGE, TrackedEvaluator, usage_tracker
 
-# Setup the OpenAI client to use either Azure or GitHub Models
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
-
-if API_HOST == "azure":
-    credential = azure.identity.DefaultAzureCredential()
-    token_provider = azure.identity.get_bearer_token_provider(
-        credential, "https://cognitiveservices.azure.com/.default"
-    )
-    model_config: AzureOpenAIModelConfiguration = {
-        "azure_endpoint": os.environ["AZURE_AI_ENDPOINT"],
-        "azure_deployment": os.environ["AZURE_AI_CHAT_DEPLOYMENT"],
-    }
-elif API_HOST == "github":
-    model_config: OpenAIModelConfiguration = {
-        "type": "openai",
-        "api_key": os.environ["GITHUB_TOKEN"],
-        "base_url": "https://models.inference.ai.azure.com",
-        "model": os.getenv("GITHUB_MODEL", "gpt-4o"),
-    }
+# Judge model settings for Azure or GitHub Models (see app_config.py)
+model_config = get_model_config()
 
 context = 'Dining chair. Wooden seat. Four legs. Backrest. Brown. 18" wide, 20" deep, 35" tall. Holds 250 lbs.'
 query = "Given the product specification for the Contoso Home Furnishings Dining Chair, provide an engaging marketing product description."
 ground_truth = 'The dining chair is brown and wooden with four legs and a backrest. The dimensions are 18" wide, 20" deep, 35" tall. The dining chair has a weight capacity of 250 lbs.'
 response = 'Introducing our timeless wooden dining chair, designed for both comfort and durability. Crafted with a solid wood seat and sturdy four-legged base, this chair offers reliable support for up to 250 lbs. The smooth brown finish adds a touch of rustic elegance, while the ergonomically shaped backrest ensures a comfortable dining experience. Measuring 18" wide, 20" deep, and 35" tall, it\'s the perfect blend of form and function, making it a versatile addition to any dining space. Elevate your home with this beautifully simple yet sophisticated seating option.'
 
-groundedness_eval = GroundednessEvaluator(model_config)
-groundedness_score = groundedness_eval(
-    response=response,
-    context=context,
-)
-rich.print("Groundedness", groundedness_score)
+# Reuse judge results for inputs that were already scored with the same evaluator and model.
+judge_cache = VerdictCache(DEFAULT_JUDGE_CACHE_PATH)
+# Only cache misses reach the judge, so only they are counted in the token usage summary.
+judge_model = model_identity(model_config)
+
+
+def cached_judge(evaluator_class):
+    return CachedJudge(
+        TrackedEvaluator(evaluator_class(model_config), ROLE_QUALITY_JUDGE, judge_model), model_config, judge_cache
+    )
+
+
+groundedness_eval = cached_judge(GroundednessEvaluator)
+relevance_eval = cached_judge(RelevanceEvaluator)
+coherence_eval = cached_judge(CoherenceEvaluator)
+fluency_eval = cached_judge(FluencyEvaluator)
+similarity_eval = cached_judge(SimilarityEvaluator)
+
+parser = argparse.ArgumentParser(description="Evaluate a sample answer with the built-in LLM quality judges.")
+parser.add_argument("--combined", action="store_true", help="Score all five metrics with a single judge call.")
+args = parser.parse_args()
+
+if args.combined:
+    # One judge call for all five metrics; any metric it fails to score falls back to its own evaluator.
+    combined_judge = CombinedJudge(
+        model_config,
+        fallback_evaluators={
+            "groundedness": groundedness_eval,
+            "relevance": relevance_eval,
+            "coherence": coherence_eval,
+            "fluency": fluency_eval,
+            "similarity": similarity_eval,
+        },
+    )
+    combined_eval = CachedJudge(combined_judge, model_config, judge_cache, version=combined_judge.version)
+    scores = combined_eval(query=query, response=response, context=context, ground_truth=ground_truth)
+    for metric, score in scores.items():
+        rich.print(metric.capitalize(), score)
+    rich.print("Combined judge fallbacks", combined_judge.fallbacks)
+else:
+    groundedness_score = groundedness_eval(
+        response=response,
+        context=context,
+    )
+    rich.print("Groundedness", groundedness_score)
+
+    relevance_score = relevance_eval(response=response, query=query)
+    rich.print("Relevance", relevance_score)
 
-relevance_eval = RelevanceEvaluator(model_config)
-relevance_score = relevance_eval(response=response, query=query)
-rich.print("Relevance", relevance_score)
+    coherence_score = coherence_eval(response=response, query=query)
+    rich.print("Coherence", coherence_score)
 
-coherence_eval = CoherenceEvaluator(model_config)
-coherence_score = coherence_eval(response=response, query=query)
-rich.print("Coherence", coherence_score)
+    fluency_score = fluency_eval(response=response, query=query)
+    rich.print("Fluency", fluency_score)
 
-fluency_eval = FluencyEvaluator(model_config)
-fluency_score = fluency_eval(response=response, query=query)
-rich.print("Fluency", fluency_score)
+    similarity_score = similarity_eval(response=response, query=query, ground_truth=ground_truth)
+    rich.print("Similarity", similarity_score)
 
-similarity_eval = SimilarityEvaluator(model_config)
-similarity_score = similarity_eval(response=response, query=query, ground_truth=ground_truth)
-rich.print("Similarity", similarity_score)
+rich.print("Judge cache", judge_cache.stats())
+rich.print("Token usage", usage_tracker.summary()["totals"])
+usage_tracker.write_summary(Path(__file__).resolve().parent / "quality-eval-usage-builtin-judges.json")
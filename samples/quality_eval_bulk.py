@@ -1,50 +1,70 @@
-import os
+from pathlib import Path
 
-import azure.identity
+from app_config import get_model_config
 from azure.ai.evaluation import (
-    AzureOpenAIModelConfiguration,
     GroundednessEvaluator,
-    OpenAIModelConfiguration,
     RelevanceEvaluator,
     evaluate,
 )
-from dotenv import load_dotenv
+from judge_cache import DEFAULT_JUDGE_CACHE_PATH, CachedJudge, model_identity
+from quality_results import write_results
+from safety_cache import VerdictCache
+from usage_tracking import ROLE_QUALITY_JUDGE, TrackedEvaluator, usage_tracker
 
-# Setup the OpenAI client to use either Azure or GitHub Models
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
+# Judge model settings for Azure or GitHub Models (see app_config.py)
+model_config = get_model_config()
 
-if API_HOST == "azure":
-    credential = azure.identity.DefaultAzureCredential()
-    token_provider = azure.identity.get_bearer_token_provider(
-        credential, "https://cognitiveservices.azure.com/.default"
-    )
-    model_config: AzureOpenAIModelConfiguration = {
-        "azure_endpoint": os.environ["AZURE_AI_ENDPOINT"],
-        "azure_deployment": os.environ["AZURE_AI_CHAT_DEPLOYMENT"],
-    }
-elif API_HOST == "github":
-    model_config: OpenAIModelConfiguration = {
-        "type": "openai",
-        "api_key": os.environ["GITHUB_TOKEN"],
-        "base_url": "https://models.inference.ai.azure.com",
-        "model": os.getenv("GITHUB_MODEL", "gpt-4o"),
+# column mapping
+EVALUATOR_CONFIG = {
+    "default": {
+        "query": "${data.query}",
+        "response": "${data.response}",
+        "context": "${data.context}",
     }
+}
+
+
+def build_evaluators() -> dict:
+    # Reuse judge results for inputs that were already scored with the same evaluator and model.
+    judge_cache = VerdictCache(DEFAULT_JUDGE_CACHE_PATH)
+    # Only cache misses reach the judge, so only they are counted in the token usage summary.
+    judge_model = model_identity(model_config)
+    groundedness_eval = CachedJudge(
+        TrackedEvaluator(GroundednessEvaluator(model_config), ROLE_QUALITY_JUDGE, judge_model),
+        model_config,
+        judge_cache,
+    )
+    relevance_eval = CachedJudge(
+        TrackedEvaluator(RelevanceEvaluator(model_config), ROLE_QUALITY_JUDGE, judge_model),
+        model_config,
+        judge_cache,
+    )
+    return {"relevance": relevance_eval, "groundedness": groundedness_eval}
+
+
+def main():
+    """
+    Evaluate the test data and write the results row per line.
+    evaluate() only returns once every row has been scored, with all rows in one list, so this script holds
+    the whole run in memory and writes nothing if it fails part-way. Use quality_eval_sharded.py for large
+    datasets: it evaluates one shard at a time and keeps each finished shard's results on disk.
+    """
+    samples_dir = Path(__file__).resolve().parent
+    result = evaluate(
+        data=str(samples_dir / "quality-eval-testdata.jsonl"),
+        evaluators=build_evaluators(),
+        evaluator_config=EVALUATOR_CONFIG,
+    )
+    # One JSON object per row, then the metrics (see quality_results.py). The rows are only available here,
+    # after evaluate() has returned, so they cannot be streamed to the file as they are scored.
+    write_results(
+        samples_dir / "quality-eval-results.jsonl",
+        result["rows"],
+        result["metrics"],
+        studio_url=result.get("studio_url"),
+    )
+    usage_tracker.write_summary(samples_dir / "quality-eval-usage.json")
+
 
-groundedness_eval = GroundednessEvaluator(model_config)
-
-relevance_eval = RelevanceEvaluator(model_config)
-
-result = evaluate(
-    data="quality-eval-testdata.jsonl",
-    evaluators={"relevance": relevance_eval, "groundedness": groundedness_eval},
-    # column mapping
-    evaluator_config={
-        "default": {
-            "query": "${data.query}",
-            "response": "${data.response}",
-            "context": "${data.context}",
-        }
-    },
-    output_path="quality-eval-results.jsonl",
-)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,35 @@
-import os
+from pathlib import Path
 
-import azure.identity
 import rich
+from app_config import get_model_config
 from azure.ai.evaluation import (
-    AzureOpenAIModelConfiguration,
     GroundednessEvaluator,
-    OpenAIModelConfiguration,
 )
-from dotenv import load_dotenv
+from judge_cache import DEFAULT_JUDGE_CACHE_PATH, CachedJudge, model_identity
+from safety_cache import VerdictCache
+from usage_tracking import ROLE_QUALITY_JUDGE, TrackedEvaluator, usage_tracker
 
-# Setup the OpenAI client to use either Azure or GitHub Models
-load_dotenv(override=True)
-API_HOST = os.getenv("API_HOST", "github")
-
-if API_HOST == "azure":
-    credential = azure.identity.DefaultAzureCredential()
-    token_provider = azure.identity.get_bearer_token_provider(
-        credential, "https://cognitiveservices.azure.com/.default"
-    )
-    model_config: AzureOpenAIModelConfiguration = {
-        "azure_endpoint": os.environ["AZURE_AI_ENDPOINT"],
-        "azure_deployment": os.environ["AZURE_AI_CHAT_DEPLOYMENT"],
-    }
-elif API_HOST == "github":
-    model_config: OpenAIModelConfiguration = {
-        "type": "openai",
-        "api_key": os.environ["GITHUB_TOKEN"],
-        "base_url": "https://models.inference.ai.azure.com",
-        "model": os.getenv("GITHUB_MODEL", "gpt-4o"),
-    }
+# Judge model settings for Azure or GitHub Models (see app_config.py)
+model_config = get_model_config()
 
 query = "Given the product specification for the Contoso Home Furnishings Dining Chair, provide an engaging marketing product description."
 context = 'Dining chair. Wooden seat. Four legs. Backrest. Brown. 18" wide, 20" deep, 35" tall. Holds 250 lbs.'
 response = 'Introducing our timeless wooden dining chair, designed for both comfort and durability. Crafted with a solid teak seat and sturdy four-legged base, this chair offers reliable support for up to 250 lbs. The smooth brown finish adds a touch of rustic elegance, while the ergonomically shaped backrest ensures a comfortable dining experience. Measuring 18" wide, 20" deep, and 35" tall, it\'s the perfect blend of form and function, making it a versatile addition to any dining space. Elevate your home with this beautifully simple yet sophisticated seating option.'
 
-groundedness_eval = GroundednessEvaluator(model_config)
+# Reuse judge results for inputs that were already scored with the same evaluator and model.
+judge_cache = VerdictCache(DEFAULT_JUDGE_CACHE_PATH)
+
+# Only cache misses reach the judge, so only they are counted in the token usage summary.
+groundedness_eval = CachedJudge(
+    TrackedEvaluator(GroundednessEvaluator(model_config), ROLE_QUALITY_JUDGE, model_identity(model_config)),
+    model_config,
+    judge_cache,
+)
 groundedness_score = groundedness_eval(
     query=query,
     context=context,
     response=response,
 )
 rich.print(groundedness_score)
+rich.print("Judge cache", judge_cache.stats())
+usage_tracker.write_summary(Path(__file__).resolve().parent / "quality-eval-usage-groundedness.json")
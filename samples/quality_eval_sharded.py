@@ -0,0 +1,182 @@
+# Sharded runner for quality_eval_bulk.py on large JSONL datasets.
+# A single evaluate() call works through the whole file in one process. This script splits the
+# input at line boundaries by byte offset (so the file is never parsed up front), evaluates each
+# shard with the same evaluators and column mapping in its own process, and merges the per-shard
+# rows and metrics into one results file. Shards can also be spread across machines that share
+# a work directory: run one --shard-index on each machine, then --merge once they have finished.
+# Shard files are keyed on the input file's size and modification time and on the shard count, so
+# results from an earlier version of the file are never reused.
+# Throughput grows with the number of workers until the judge endpoint starts rate limiting.
+
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from azure.ai.evaluation import evaluate
+from quality_eval_bulk import EVALUATOR_CONFIG, build_evaluators
+from quality_results import MetricsAccumulator, ResultsWriter, iter_rows, read_metrics, write_results
+from rich.progress import track
+
+DEFAULT_SHARD_COUNT = int(os.getenv("QUALITY_EVAL_SHARDS", str(os.cpu_count() or 4)))
+SAMPLES_DIR = Path(__file__).resolve().parent
+DEFAULT_WORK_DIR = SAMPLES_DIR / ".quality-eval-shards"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def shard_offsets(data_path: Path, shard_count: int) -> list[tuple[int, int]]:
+    """
+    Split a JSONL file into at most `shard_count` (start, end) byte ranges that each begin on a new line.
+    Every machine computes the same ranges for the same file, so shards can be assigned by index alone.
+    """
+    size = Path(data_path).stat().st_size
+    boundaries = [0]
+    with open(data_path, "rb") as f:
+        for index in range(1, shard_count):
+            f.seek(max(size * index // shard_count, boundaries[-1]))
+            # Skip to the end of the line the offset landed in; that line belongs to the previous shard.
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def input_key(data_path: Path, shard_count: int) -> str:
+    """
+    Identify one version of the input split into `shard_count` shards, so a shard's results are only reused
+    while the file is unchanged. Size and modification time are used rather than a hash to avoid reading the file.
+    """
+    stat = Path(data_path).stat()
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}-{shard_count}"
+
+
+def shard_result_path(work_dir: Path, key: str, shard_index: int) -> Path:
+    return Path(work_dir) / f"shard-{key}-{shard_index:05d}.results.jsonl"
+
+
+def run_shard(data_path: Path, shard_index: int, start: int, end: int, work_dir: Path, key: str) -> Path:
+    """
+    Evaluate the rows between byte offsets `start` and `end` and return the shard's results file.
+    A shard whose results file already exists for the same `key` is not evaluated again, so an interrupted run
+    can be restarted.
+    """
+    work_dir = Path(work_dir)
+    result_path = shard_result_path(work_dir, key, shard_index)
+    if result_path.exists():
+        return result_path
+    shard_data_path = work_dir / f"shard-{key}-{shard_index:05d}.jsonl"
+    with open(data_path, "rb") as src, open(shard_data_path, "wb") as dst:
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = src.read(min(COPY_BUFFER_SIZE, remaining))
+            if not chunk:
+                break
+            dst.write(chunk)
+            remaining -= len(chunk)
+    partial_path = result_path.with_name(result_path.name + ".partial")
+    result = evaluate(
+        data=str(shard_data_path),
+        evaluators=build_evaluators(),
+        evaluator_config=EVALUATOR_CONFIG,
+    )
+    write_results(partial_path, result["rows"], result["metrics"])
+    # Publish the results atomically so --merge never reads a half-written shard.
+    os.replace(partial_path, result_path)
+    shard_data_path.unlink()
+    return result_path
+
+
+def merge_shard_results(result_paths: list[Path], output_path: Path) -> dict:
+    """
+    Stream the rows of each shard's results into `output_path` in shard order, followed by the merged
+    metrics, and return the metrics. Only one row is held in memory at a time.
+    """
+    metrics = MetricsAccumulator()
+    with ResultsWriter(output_path) as writer:
+        for path in result_paths:
+            row_count = 0
+            for row in iter_rows(path):
+                writer.write_row(row)
+                metrics.add_row(row)
+                row_count += 1
+            metrics.add_metrics(row_count, read_metrics(path) or {})
+        merged = metrics.result()
+        writer.write_metrics(merged)
+    return merged
+
+
+def merge_into(data_path: Path, shard_count: int, work_dir: Path, output_path: Path) -> dict:
+    shards = shard_offsets(data_path, shard_count)
+    key = input_key(data_path, shard_count)
+    result_paths = [shard_result_path(work_dir, key, index) for index in range(len(shards))]
+    missing = [path.name for path in result_paths if not path.exists()]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} of {len(shards)} shards have no results yet: {', '.join(missing)}")
+    return merge_shard_results(result_paths, output_path)
+
+
+def run_sharded(
+    data_path: Path,
+    output_path: Path,
+    shard_count: int = DEFAULT_SHARD_COUNT,
+    max_workers: int | None = None,
+    work_dir: Path = DEFAULT_WORK_DIR,
+    keep_shards: bool = False,
+) -> dict:
+    """
+    Evaluate every shard in a local process pool, merge the results into `output_path` and return the metrics.
+    Unless `keep_shards` is set, only the shard results this run wrote are deleted afterwards, since `work_dir`
+    may be shared with other runs.
+    """
+    work_dir = Path(work_dir)
+    created_work_dir = not work_dir.exists()
+    work_dir.mkdir(parents=True, exist_ok=True)
+    shards = shard_offsets(data_path, shard_count)
+    key = input_key(data_path, shard_count)
+    result_paths = [shard_result_path(work_dir, key, index) for index in range(len(shards))]
+    created_paths = [path for path in result_paths if not path.exists()]
+    # Spawn rather than fork: evaluate() starts threads and each worker opens its own judge cache connection.
+    with ProcessPoolExecutor(
+        max_workers=max_workers or len(shards), mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(run_shard, data_path, index, start, end, work_dir, key)
+            for index, (start, end) in enumerate(shards)
+        ]
+        for future in track(as_completed(futures), total=len(futures), description="Evaluating shards..."):
+            future.result()
+    metrics = merge_into(data_path, shard_count, work_dir, output_path)
+    if not keep_shards:
+        for path in created_paths:
+            path.unlink(missing_ok=True)
+        if created_work_dir and not any(work_dir.iterdir()):
+            work_dir.rmdir()
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run quality_eval_bulk.py over a large JSONL file in shards.")
+    parser.add_argument("--data", type=Path, default=SAMPLES_DIR / "quality-eval-testdata.jsonl")
+    parser.add_argument("--output", type=Path, default=SAMPLES_DIR / "quality-eval-results.jsonl")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARD_COUNT)
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to one per shard).")
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR, help="Directory for per-shard results.")
+    parser.add_argument("--shard-index", type=int, help="Evaluate only this shard, e.g. one per machine.")
+    parser.add_argument("--merge", action="store_true", help="Merge the shard results in --work-dir and exit.")
+    parser.add_argument("--keep-shards", action="store_true", help="Keep the per-shard results after merging.")
+    args = parser.parse_args()
+
+    if args.shard_index is not None:
+        args.work_dir.mkdir(parents=True, exist_ok=True)
+        shards = shard_offsets(args.data, args.shards)
+        if not 0 <= args.shard_index < len(shards):
+            parser.error(f"--shard-index must be between 0 and {len(shards) - 1} for this file.")
+        start, end = shards[args.shard_index]
+        key = input_key(args.data, args.shards)
+        print(run_shard(args.data, args.shard_index, start, end, args.work_dir, key))
+    elif args.merge:
+        print(merge_into(args.data, args.shards, args.work_dir, args.output))
+    else:
+        print(run_sharded(args.data, args.output, args.shards, args.workers, args.work_dir, args.keep_shards))
@@ -0,0 +1,149 @@
+# Row-per-line results files for the quality evaluation scripts.
+# evaluate(output_path=...) writes the whole run as a single line, {"rows": [...], "metrics": {...}},
+# so reading one row means loading every row. Results are instead written as one JSON object per
+# evaluated row, followed by a single {"metrics": {...}} record, which keeps large results files
+# tail-able, grep-able and readable in constant memory. The readers also accept the old format.
+
+import json
+import math
+import os
+from pathlib import Path
+
+METRICS_KEY = "metrics"
+# How far from the end of the file to look for the trailing metrics record before reading further back.
+TAIL_READ_SIZE = 64 * 1024
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value)
+
+
+def is_metrics_record(record: dict) -> bool:
+    # Rows only have "inputs.*" and "outputs.*" columns, so a top-level "metrics" key marks the trailing record.
+    return METRICS_KEY in record and not any(key.startswith(("inputs.", "outputs.")) for key in record)
+
+
+class ResultsWriter:
+    """
+    Appends evaluated rows to a results file as they become available, then the metrics record.
+    Every line is flushed, so the file can be followed while a run is in progress.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.row_count = 0
+        self._file = None
+
+    def write_row(self, row: dict):
+        self._file.write(json.dumps(row, default=str) + "\n")
+        self._file.flush()
+        self.row_count += 1
+
+    def write_metrics(self, metrics: dict, **extra):
+        self._file.write(json.dumps({METRICS_KEY: metrics, **extra}, default=str) + "\n")
+        self._file.flush()
+
+    def __enter__(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+def write_results(path: Path, rows, metrics: dict, **extra) -> None:
+    """
+    Write an evaluate() result (its rows and metrics) in the row-per-line format.
+    """
+    with ResultsWriter(path) as writer:
+        for row in rows:
+            writer.write_row(row)
+        writer.write_metrics(metrics, **extra)
+
+
+def _iter_records(path: Path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_rows(path: Path):
+    """
+    Lazily yield the evaluated rows of a results file, one at a time.
+    """
+    for record in _iter_records(path):
+        if "rows" in record and METRICS_KEY in record:
+            # Old single-line format: the rows are already in memory once the line is parsed.
+            yield from record["rows"]
+        elif not is_metrics_record(record):
+            yield record
+
+
+def _last_line(path: Path) -> str | None:
+    # Read backwards from the end of the file in growing blocks until a complete last line is found.
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        read_size = TAIL_READ_SIZE
+        while True:
+            start = max(0, size - read_size)
+            f.seek(start)
+            lines = f.read(size - start).splitlines()
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                if start == 0:
+                    return None
+            elif len(lines) > 1 or start == 0:
+                return lines[-1].decode("utf-8")
+            read_size *= 2
+
+
+def read_metrics(path: Path) -> dict | None:
+    """
+    Return the metrics of a results file without reading its rows, or None if the run has not finished.
+    """
+    line = _last_line(path)
+    if line is None:
+        return None
+    record = json.loads(line)
+    return record[METRICS_KEY] if METRICS_KEY in record else None
+
+
+class MetricsAccumulator:
+    """
+    Running means of the numeric "outputs.*" row columns, for merging metrics without keeping rows in memory.
+    Metrics with no numeric row column (such as pass-rate aggregates) fall back to a row-weighted average
+    of the metrics reported for each part. If only rows are added, every numeric column is reported.
+    """
+
+    def __init__(self):
+        self.sums: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.weighted_sums: dict[str, float] = {}
+        self.weights: dict[str, int] = {}
+        # Metric names in the order they were first reported.
+        self.names: dict[str, None] = {}
+
+    def add_row(self, row: dict):
+        for column, value in row.items():
+            if column.startswith("outputs.") and is_number(value):
+                name = column.removeprefix("outputs.")
+                self.sums[name] = self.sums.get(name, 0) + value
+                self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_metrics(self, row_count: int, metrics: dict):
+        for name, value in metrics.items():
+            self.names.setdefault(name)
+            if is_number(value):
+                self.weighted_sums[name] = self.weighted_sums.get(name, 0) + row_count * value
+                self.weights[name] = self.weights.get(name, 0) + row_count
+
+    def result(self) -> dict:
+        merged = {}
+        for name in self.names or self.counts:
+            if self.counts.get(name):
+                merged[name] = self.sums[name] / self.counts[name]
+            elif self.weights.get(name):
+                merged[name] = self.weighted_sums[name] / self.weights[name]
+        return merged
@@ -0,0 +1,307 @@
+# Adaptive per-endpoint rate limiting shared by the model targets and the safety evaluator.
+# Once requests run concurrently, the model endpoints and the safety evaluation service start
+# answering 429. Without retries those turn into "app error" replies that score as defects.
+# Each endpoint gets one limiter that paces requests (additive increase on success,
+# multiplicative decrease on throttling), pauses everyone for the server's Retry-After,
+# and retries transient failures with jittered exponential backoff.
+
+import asyncio
+import contextlib
+import email.utils
+import functools
+import importlib
+import os
+import random
+import threading
+import time
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+DEFAULT_MAX_RATE = float(os.getenv("RATE_LIMIT_MAX_RPS", "50"))
+DEFAULT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "6"))
+# Limiter key for the Azure AI safety evaluation service behind ContentSafetyEvaluator.
+SAFETY_EVALUATION_LIMITER = "azure-ai-safety-evaluation"
+# Concurrency settings (with their defaults) that callers of the model endpoints and of the safety
+# evaluator are bounded by; limiters start from these unless RATE_LIMIT_INITIAL_RPS is set.
+MODEL_CONCURRENCY_SETTING = ("AZURE_AI_MAX_CONCURRENCY", "32")
+EVALUATION_CONCURRENCY_SETTING = ("AZURE_AI_EVAL_CONCURRENCY", "16")
+
+
+def default_initial_rate(name: str) -> float:
+    """
+    Starting rate for the limiter of `name`: RATE_LIMIT_INITIAL_RPS if set, otherwise one request per second
+    for every request the callers may have in flight, so pacing does not hold back the configured concurrency
+    while the rate ramps up. Capped at the maximum rate.
+    """
+    configured = os.getenv("RATE_LIMIT_INITIAL_RPS")
+    if configured:
+        return float(configured)
+    is_evaluator = name == SAFETY_EVALUATION_LIMITER
+    variable, default = EVALUATION_CONCURRENCY_SETTING if is_evaluator else MODEL_CONCURRENCY_SETTING
+    return min(DEFAULT_MAX_RATE, float(os.getenv(variable, default)))
+
+
+class TransientError(Exception):
+    """
+    Raised for a retryable HTTP status, carrying the server's Retry-After delay if it sent one.
+    """
+
+    def __init__(self, message: str, status_code: int | None = None, retry_after: float | None = None, response=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        # The last HTTP response, so callers can still report it once retries are exhausted.
+        self.response = response
+
+
+def parse_retry_after(headers) -> float | None:
+    """
+    Read the retry delay in seconds from Retry-After (seconds or HTTP date) or the Azure millisecond variants.
+    """
+    if not headers:
+        return None
+    for name in ("retry-after-ms", "x-ms-retry-after-ms"):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def raise_for_transient_status(response):
+    """
+    Raise TransientError for a requests/httpx response with a retryable status code.
+    """
+    if response.status_code in TRANSIENT_STATUS_CODES:
+        raise TransientError(
+            f"HTTP {response.status_code}",
+            status_code=response.status_code,
+            retry_after=parse_retry_after(response.headers),
+            response=response,
+        )
+
+
+# Connection and timeout exceptions of the HTTP clients the samples use, as (module, class names).
+TRANSPORT_ERRORS = {
+    "httpx": ("NetworkError", "TimeoutException", "RemoteProtocolError"),
+    "azure.core.exceptions": ("ServiceRequestError", "ServiceResponseError"),
+    "openai": ("APIConnectionError",),
+    "requests.exceptions": ("ConnectionError", "Timeout"),
+    "aiohttp": ("ClientConnectionError", "ServerTimeoutError"),
+}
+
+
+@functools.cache
+def transport_error_types() -> tuple[type[Exception], ...]:
+    """
+    Exception types for connection failures and timeouts: the builtin ones and those in TRANSPORT_ERRORS,
+    for the clients that are installed.
+    """
+    types = [ConnectionError, TimeoutError]
+    for module_name, class_names in TRANSPORT_ERRORS.items():
+        with contextlib.suppress(ImportError):
+            module = importlib.import_module(module_name)
+            types.extend(getattr(module, class_name) for class_name in class_names)
+    return tuple(types)
+
+
+def classify_error(error: Exception) -> tuple[bool, int | None, float | None]:
+    """
+    Return (retryable, status_code, retry_after) for an exception raised by a target or evaluator call.
+    Handles TransientError, errors carrying an HTTP status code (azure-core HttpResponseError, openai
+    APIStatusError) and the HTTP clients' connection and timeout errors. An error that is none of these is
+    classified by the exception it was raised from, so SDK wrappers around an HTTP error are still retried.
+    """
+    if isinstance(error, TransientError):
+        return True, error.status_code, error.retry_after
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status_code is not None:
+        retry_after = parse_retry_after(getattr(response, "headers", None))
+        return status_code in TRANSIENT_STATUS_CODES, status_code, retry_after
+    if isinstance(error, transport_error_types()):
+        return True, None, None
+    if error.__cause__ is not None:
+        return classify_error(error.__cause__)
+    return False, None, None
+
+
+class AdaptiveRateLimiter:
+    """
+    AIMD rate limiter for one endpoint, usable from both coroutines and worker threads.
+    Requests are spaced 1 / rate seconds apart. Every success nudges the rate up; a 429 halves it
+    (at most once per second) and holds all callers until the Retry-After delay has passed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_rate: float | None = None,
+        min_rate: float = 0.2,
+        max_rate: float = DEFAULT_MAX_RATE,
+        additive_increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_backoff: float = 60.0,
+    ):
+        self.name = name
+        self.rate = initial_rate or default_initial_rate(name)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.queue_depth = 0
+        self.throttled = 0
+        self.retries = 0
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # Reserve the next send slot and return how long the caller must wait for it.
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + 1 / self.rate
+            self.queue_depth += 1
+            return slot - now
+
+    def _release(self):
+        with self._lock:
+            self.queue_depth -= 1
+
+    def on_success(self):
+        with self._lock:
+            # Roughly +additive_increase requests/second for every second of clean traffic.
+            self.rate = min(self.max_rate, self.rate + self.additive_increase / self.rate)
+
+    def on_throttle(self, retry_after: float | None):
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now - self._last_decrease >= 1.0:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_decrease = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, min(1.0, retry_after * 0.1))
+        # Full jitter: spread retries evenly instead of having every caller retry in lockstep.
+        return random.uniform(0, min(self.max_backoff, 0.5 * 2**attempt))
+
+    def _should_retry(self, error: Exception, attempt: int) -> float | None:
+        retryable, status_code, retry_after = classify_error(error)
+        if not retryable or attempt >= self.max_retries:
+            return None
+        if status_code == 429:
+            self.on_throttle(retry_after)
+        with self._lock:
+            self.retries += 1
+        return self._backoff(attempt, retry_after)
+
+    async def run_async(self, fn, *args, **kwargs):
+        """
+        Await `fn(*args, **kwargs)` under this limiter, retrying transient failures.
+        """
+        attempt = 0
+        while True:
+            delay = self._reserve()
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._release()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                backoff = self._should_retry(e, attempt)
+                if backoff is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(backoff)
+                continue
+            self.on_success()
+            return result
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Call `fn(*args, **kwargs)` under this limiter from a worker thread, retrying transient failures.
+        """
+        attempt = 0
+        while True:
+            delay = self._reserve()
+            try:
+                time.sleep(delay)
+            finally:
+                self._release()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                backoff = self._should_retry(e, attempt)
+                if backoff is None:
+                    raise
+                attempt += 1
+                time.sleep(backoff)
+                continue
+            self.on_success()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "rate": round(self.rate, 2),
+                "queue_depth": self.queue_depth,
+                "throttled": self.throttled,
+                "retries": self.retries,
+            }
+
+
+class RateLimited:
+    """
+    Wraps a synchronous callable (such as an evaluator) so every call goes through a limiter.
+    Keeps the wrapped callable reachable as `__wrapped__` for signature inspection and cache keys.
+    """
+
+    def __init__(self, fn, limiter: AdaptiveRateLimiter):
+        self.__wrapped__ = fn
+        self.limiter = limiter
+
+    def __call__(self, *args, **kwargs):
+        return self.limiter.run(self.__wrapped__, *args, **kwargs)
+
+
+_limiters: dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint: str, **options) -> AdaptiveRateLimiter:
+    """
+    Return the limiter shared by every caller of `endpoint`, creating it on first use.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint)
+        if limiter is None:
+            limiter = _limiters[endpoint] = AdaptiveRateLimiter(endpoint, **options)
+        return limiter
+
+
+def all_limiter_stats() -> list[dict]:
+    with _limiters_lock:
+        return [limiter.stats() for limiter in _limiters.values()]
@@ -0,0 +1,161 @@
+# Persistent cache of ContentSafetyEvaluator verdicts (also backs the quality judge cache in judge_cache.py).
+# With a fixed randomization_seed (and temperature=0 targets) reruns keep sending the same
+# (query, response) pairs to the safety service. Verdicts are stored in a local SQLite database
+# keyed by a hash of the query, response, evaluator name and evaluator version, so repeated pairs
+# are answered locally instead of making another remote call.
+
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(os.getenv("SAFETY_EVAL_CACHE", Path(__file__).resolve().parent / ".safety-eval-cache.sqlite"))
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_AGE_DAYS = 30
+# Eviction runs on open and then after every this many inserts.
+EVICT_EVERY = 500
+
+
+def evaluator_version() -> str:
+    try:
+        return importlib.metadata.version("azure-ai-evaluation")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class VerdictCache:
+    """
+    SQLite-backed store of evaluator verdicts with least-recently-used and age-based eviction.
+    Safe to share between the threads that run evaluator calls.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._connect()
+        self.evict()
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            "key TEXT PRIMARY KEY, verdict TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+
+    def __getstate__(self):
+        # Evaluators may be shipped to worker processes; each process opens its own connection.
+        state = self.__dict__.copy()
+        del state["_db"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._connect()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently.
+            encoded = part.encode("utf-8")
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT verdict FROM verdicts WHERE key = ? AND created_at >= ?",
+                (key, now - self.max_age_seconds),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE verdicts SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, verdict: dict):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(verdict, default=str), now, now),
+            )
+            self._db.commit()
+            self._inserts += 1
+            should_evict = self._inserts % EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            self._db.execute("DELETE FROM verdicts WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            self._db.execute(
+                "DELETE FROM verdicts WHERE key IN "
+                "(SELECT key FROM verdicts ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "entries": entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CachedSafetyEvaluator:
+    """
+    Drop-in wrapper around a safety evaluator that answers repeated (query, response) pairs from the cache.
+    """
+
+    def __init__(self, safety_eval, cache: VerdictCache, version: str | None = None):
+        self.safety_eval = safety_eval
+        self.cache = cache
+        # Name the underlying evaluator, not wrappers such as RateLimited.
+        self.name = type(inspect.unwrap(safety_eval)).__name__
+        self.version = version or evaluator_version()
+
+    def __call__(self, *, query: str, response: str) -> dict:
+        key = VerdictCache.make_key(self.name, self.version, query, response)
+        verdict = self.cache.get(key)
+        if verdict is None:
+            verdict = self.safety_eval(query=query, response=response)
+            self.cache.put(key, verdict)
+        return verdict
@@ -0,0 +1,219 @@
+# This script evaluates the safety of several models against the same adversarial queries in a single run.
+# The adversarial queries are simulated once and sent to every selected model concurrently:
+# gpt-4o through the Azure OpenAI REST endpoint, and Llama, DeepSeek and Jamba through the Azure AI Inference SDK.
+# All responses are scored through one shared ContentSafetyEvaluator pool, and the results are saved
+# to one safety-eval-results-<model>.json file per model.
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+from pathlib import Path
+
+import azure.identity
+from app_config import load_environment
+from azure.ai.evaluation.simulator import (
+    AdversarialScenario,
+    AdversarialSimulator,
+    SupportedLanguages,
+)
+from early_stopping import DEFAULT_THRESHOLD, PassRateEstimator
+from inference_async import DEFAULT_MAX_CONCURRENCY, AsyncChatTarget
+from rate_limit import SAFETY_EVALUATION_LIMITER, RateLimited, all_limiter_stats, get_limiter
+from rich.logging import RichHandler
+from safety_cache import CachedSafetyEvaluator, VerdictCache
+from safety_journal import simulate_and_score_many
+from safety_scoring import DEFAULT_MAX_IN_FLIGHT, make_safety_evaluator
+from stage_tracing import tracer
+from stream_metrics import streaming_stats, streaming_target
+from usage_tracking import (
+    ROLE_SAFETY_EVALUATOR,
+    ROLE_SIMULATOR,
+    SAFETY_SERVICE_MODEL,
+    SIMULATOR_MODEL,
+    TrackedEvaluator,
+    track_async,
+    usage_tracker,
+)
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(message)s",
+    datefmt="[%X]",
+    handlers=[RichHandler(rich_tracebacks=True)],
+)
+
+load_environment()
+if os.getenv("AZURE_AI_ENDPOINT") is None or os.getenv("AZURE_AI_PROJECT") is None:
+    raise ValueError(
+        "Some Azure environment variables are missing. This code requires Azure AI endpoint and Azure AI Project."
+    )
+
+credential = azure.identity.DefaultAzureCredential()
+
+
+def inference_target(api_key_env: str, model_env: str, default_model: str, temperature: float, top_p: float):
+    api_key = os.getenv(api_key_env)
+    if not api_key:
+        raise ValueError(f"{api_key_env} environment variable is missing.")
+    return AsyncChatTarget(
+        endpoint=os.environ["AZURE_AI_ENDPOINT"],
+        api_key=api_key,
+        model_name=os.getenv(model_env, default_model),
+        temperature=temperature,
+        top_p=top_p,
+    )
+
+
+def gpt4o_target():
+    # Imported lazily so the gpt-4o deployment settings are only needed when gpt-4o is selected.
+    from safety_eval_gpt4o import callback
+
+    return callback
+
+
+# Target factories by model name, using the same settings as the single-model scripts.
+TARGETS = {
+    "gpt4o": gpt4o_target,
+    "llama": functools.partial(
+        inference_target, "AZURE_AI_API_KEY_LLAMA", "AZURE_AI_MODEL_LLAMA", "Llama-3.3-70B-Instruct", 0.8, 0.1
+    ),
+    "deepseek": functools.partial(inference_target, "AZURE_AI_API_KEY", "AZURE_AI_MODEL_DS", "DeepSeek-V3", 0, 1.0),
+    "jamba": functools.partial(
+        inference_target, "AZURE_AI_API_KEY", "AZURE_AI_MODEL_JAMBA", "AI21-Jamba-1.5-Large", 0.8, 0.1
+    ),
+}
+
+
+async def run_safety_eval(
+    models: list[str],
+    max_simulations: int = 1,
+    eval_concurrency: int = DEFAULT_MAX_IN_FLIGHT,
+    resume: bool = False,
+    use_cache: bool = True,
+    early_stopping: bool = False,
+    early_stop_threshold: float | None = DEFAULT_THRESHOLD,
+    stream: bool = False,
+):
+    # Trace every stage (simulation, target and evaluator calls, file I/O) to a JSONL file of spans.
+    tracer.start(Path(__file__).resolve().parent / "safety-eval-trace-multi.jsonl")
+    # Configure the Azure AI project connection for evaluation.
+    azure_ai_project = {
+        "subscription_id": os.getenv("AZURE_SUBSCRIPTION_ID"),
+        "resource_group_name": os.getenv("AZURE_RESOURCE_GROUP"),
+        "project_name": os.getenv("AZURE_AI_PROJECT"),
+    }
+    results_dir = Path(__file__).resolve().parent
+    targets = {model: TARGETS[model]() for model in models}
+
+    # Simulate the adversarial queries once; every target answers each one.
+    adversarial_simulator = AdversarialSimulator(azure_ai_project=azure_ai_project, credential=credential)
+    simulate = functools.partial(
+        adversarial_simulator,
+        scenario=AdversarialScenario.ADVERSARIAL_QA,
+        max_simulation_results=max_simulations,
+        language=SupportedLanguages.English,
+        randomization_seed=42,
+        concurrent_async_task=DEFAULT_MAX_CONCURRENCY,
+    )
+    # Records the simulator's wall time per batch; the simulation service does not report its token usage.
+    simulate = track_async(simulate, ROLE_SIMULATOR, SIMULATOR_MODEL)
+
+    # Score all targets through one evaluator pool.
+    # Do not save the outputs, as they may contain disturbing content.
+    # Pace evaluator calls and retry throttled ones, so 429s from the service are not lost.
+    safety_eval = RateLimited(
+        TrackedEvaluator(
+            make_safety_evaluator(credential, azure_ai_project),
+            ROLE_SAFETY_EVALUATOR,
+            SAFETY_SERVICE_MODEL,
+        ),
+        get_limiter(SAFETY_EVALUATION_LIMITER),
+    )
+    verdict_cache = VerdictCache() if use_cache else None
+    if verdict_cache is not None:
+        safety_eval = CachedSafetyEvaluator(safety_eval, verdict_cache)
+    # Each model stops being queried once its pass rates are known precisely enough.
+    estimators = (
+        {model: PassRateEstimator(threshold=early_stop_threshold) for model in models} if early_stopping else None
+    )
+    try:
+        summaries = await simulate_and_score_many(
+            simulate,
+            # The simulator never asks for streaming; in streaming mode every reply is streamed and timed.
+            {model: streaming_target(target) for model, target in targets.items()} if stream else targets,
+            safety_eval,
+            journal_paths={model: results_dir / f"safety-eval-journal-{model}.jsonl" for model in models},
+            total=max_simulations,
+            max_in_flight=eval_concurrency,
+            resume=resume,
+            estimators=estimators,
+        )
+    finally:
+        for target in targets.values():
+            if isinstance(target, AsyncChatTarget):
+                await target.close()
+        if "gpt4o" in targets:
+            # The gpt-4o callback sends every request through one pooled HTTP client.
+            from safety_eval_gpt4o import chat_client
+
+            await chat_client.close()
+
+    if verdict_cache is not None:
+        logging.warning(f"Safety verdict cache: {verdict_cache.stats()}")
+        verdict_cache.close()
+    for model, estimator in (estimators or {}).items():
+        logging.warning(f"Pass-rate estimates for {model}: {estimator.report()}")
+    for limiter_stats in all_limiter_stats():
+        logging.warning(f"Rate limiter: {limiter_stats}")
+    logging.warning(f"Token usage: {usage_tracker.summary()['totals']}")
+
+    if stream:
+        # Serving performance of each model's streamed replies, reported next to its pass rates.
+        streaming = streaming_stats.summary()
+        for model, summary_scores in summaries.items():
+            target_model = getattr(targets[model], "model_name", os.getenv("AZURE_AI_CHAT_MODEL"))
+            summary_scores["streaming"] = streaming.get(target_model)
+            logging.warning(f"Streaming latency for {model}: {summary_scores['streaming']}")
+
+    with tracer.span("results_write"):
+        for model, summary_scores in summaries.items():
+            with open(results_dir / f"safety-eval-results-{model}.json", "w") as f:
+                json.dump(summary_scores, f, indent=4)
+        # One usage summary for the run, broken down by role and model.
+        usage_tracker.write_summary(results_dir / "safety-eval-usage-multi.json")
+    tracer.stop()
+    for stage, stage_stats in tracer.summary().items():
+        logging.warning(f"Stage {stage} latency (s) and throughput: {stage_stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the safety evaluation for several models in one run.")
+    parser.add_argument("--models", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--max-simulations", type=int, default=200)
+    parser.add_argument("--resume", action="store_true", help="Skip items already scored in the journals.")
+    parser.add_argument(
+        "--early-stop", action="store_true", help="Stop once the pass-rate confidence intervals have converged."
+    )
+    parser.add_argument(
+        "--early-stop-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="With --early-stop, also stop once each pass-rate interval lies clearly above or below this rate.",
+    )
+    parser.add_argument(
+        "--stream", action="store_true", help="Stream replies and report time to first token and tokens per second."
+    )
+    cli_args = parser.parse_args()
+    asyncio.run(
+        run_safety_eval(
+            models=cli_args.models,
+            max_simulations=cli_args.max_simulations,
+            resume=cli_args.resume,
+            early_stopping=cli_args.early_stop,
+            early_stop_threshold=cli_args.early_stop_threshold,
+            stream=cli_args.stream,
+        )
+    )
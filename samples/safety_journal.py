@@ -0,0 +1,294 @@
+# Per-item journal for safety evaluation runs, used both as a checkpoint and as an on-disk spill.
+# Each scored conversation is reduced to a compact record (query ID, target response status and
+# per-category severities, never the text itself) and appended to a JSONL file as soon as it is
+# scored. Summary scores are computed by streaming over the journal, so memory use does not grow
+# with the number of simulations, and a crashed run can be resumed without repeating the target
+# and evaluator calls it already paid for.
+
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+from pathlib import Path
+
+from digests import text_digest
+from rich.progress import Progress
+from safety_scoring import (
+    APP_ERROR_MESSAGE,
+    CONTENT_FILTER_MESSAGE,
+    DEFAULT_MAX_IN_FLIGHT,
+    EVALUATORS,
+    PASSING_SEVERITIES,
+    SafetyScorer,
+    ScoringPipeline,
+    finalize_summary_scores,
+    new_summary_scores,
+    run_until_stopped,
+    simulate_and_score,
+)
+from stage_tracing import tracer
+
+DEFAULT_CHUNK_SIZE = 50
+# Consecutive chunked batches without a single new query after which the simulator is taken to have run out.
+MAX_EMPTY_BATCHES = 3
+
+
+def response_status(answer: str | None) -> str:
+    if answer is None:
+        return "empty"
+    if answer == CONTENT_FILTER_MESSAGE["content"]:
+        return "content_filter"
+    if answer == APP_ERROR_MESSAGE["content"]:
+        return "app_error"
+    return "ok"
+
+
+def make_record(output: dict, eval_score: dict | None, batch: int | None = None) -> dict:
+    """
+    Reduce a scored conversation to its journal record. `eval_score` is None for skipped items.
+    Chunked runs also record the `batch` the item was simulated in, so a resumed run knows where to continue.
+    """
+    messages = output["messages"]
+    query = messages[0]["content"] if len(messages) > 0 else None
+    answer = messages[1]["content"] if len(messages) > 1 else None
+    record = {
+        "query_id": text_digest(query),
+        "response_hash": text_digest(answer),
+        "status": response_status(answer),
+        "scores": {evaluator: eval_score[evaluator] for evaluator in EVALUATORS} if eval_score else None,
+    }
+    if batch is not None:
+        record["batch"] = batch
+    return record
+
+
+class SafetyJournal:
+    """
+    Appends one record per simulated conversation to a JSONL journal.
+    With `resume`, records from a previous run are kept and their queries are reported as done,
+    except app errors, which are dropped from the journal so the query is retried.
+    """
+
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = Path(path)
+        self.resume = resume
+        self.completed: set[str] = set()
+        # Highest batch number in a resumed journal (0 if it has none).
+        self.last_batch = 0
+        self._file = None
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with tracer.span("journal_load", path=self.path.name) as attributes:
+            kept = [record for record in iter_journal(self.path) if record["status"] != "app_error"]
+            # Rewrite the journal without the failed items so each query has at most one record.
+            with open(self.path, "w", encoding="utf-8") as f:
+                for record in kept:
+                    f.write(json.dumps(record) + "\n")
+            attributes["records"] = len(kept)
+        self.completed = {record["query_id"] for record in kept}
+        self.last_batch = max((record.get("batch", 0) for record in kept), default=0)
+        logging.warning(f"Resuming from {self.path.name}: {len(self.completed)} items already scored.")
+
+    def is_done(self, input: dict) -> bool:
+        return text_digest(input["messages"][0]["content"]) in self.completed
+
+    def write(self, output: dict, eval_score: dict | None, batch: int | None = None):
+        record = make_record(output, eval_score, batch)
+        with tracer.span("journal_write"):
+            self._file.write(json.dumps(record) + "\n")
+            # Flush every record so a crash loses at most the items still in flight.
+            self._file.flush()
+        self.completed.add(record["query_id"])
+
+    def __enter__(self):
+        if self.resume:
+            self._load()
+        self._file = open(self.path, "a" if self.resume else "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+
+def iter_journal(path: Path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def summarize_journal(path: Path) -> dict:
+    """
+    Aggregate a journal into the same summary_scores structure the scripts write.
+    """
+    summary_scores = new_summary_scores()
+    total = 0
+    with tracer.span("journal_summarize", path=Path(path).name):
+        for record in iter_journal(path):
+            total += 1
+            if record["scores"] is None:
+                continue
+            for evaluator in EVALUATORS:
+                if record["scores"][evaluator] in PASSING_SEVERITIES:
+                    summary_scores[evaluator]["pass_count"] += 1
+    return finalize_summary_scores(summary_scores, total)
+
+
+def prime_estimator(estimator, path: Path):
+    """
+    Count the items of a resumed journal towards an early-stopping estimator.
+    """
+    for record in iter_journal(path):
+        estimator.update(record["scores"])
+
+
+async def simulate_and_score_journaled(
+    simulate,
+    target,
+    safety_eval,
+    journal_path: Path,
+    total: int,
+    chunk_size: int | None = None,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    resume: bool = False,
+    randomization_seed: int = 42,
+    estimator=None,
+) -> dict:
+    """
+    Simulate and score `total` conversations, journaling every scored item to `journal_path`,
+    and return summary scores aggregated from the journal.
+    With `chunk_size`, the simulator runs in batches of at most `chunk_size` conversations, and each
+    batch's conversations are dropped once they are journaled, so only one batch is held in memory;
+    `simulate` must then accept `max_simulation_results` and `randomization_seed` keywords. Batch k
+    asks for `chunk_size` new queries with seed `randomization_seed + k`, so every batch costs one
+    batch of simulator work. Queries already journaled (by an earlier batch or a resumed run) skip
+    both the target and the evaluator, and batches continue until `total` distinct queries are
+    scored or MAX_EMPTY_BATCHES batches in a row bring no new ones. A resumed chunked run repeats the journal's last batch,
+    so its unfinished and failed queries are retried, and then continues with new batches.
+    With `resume`, queries already in the journal skip both the target and the evaluator.
+    With an `estimator` (early_stopping.PassRateEstimator), the run stops as soon as it reports
+    that the pass rates are known precisely enough; resumed items count towards it.
+    """
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+    with SafetyJournal(journal_path, resume=resume) as journal:
+        if estimator is not None and resume:
+            prime_estimator(estimator, journal_path)
+        if not chunk_size:
+            await simulate_and_score(
+                simulate,
+                target,
+                safety_eval,
+                max_in_flight=max_in_flight,
+                total=total,
+                on_result=journal.write,
+                is_done=journal.is_done,
+                estimator=estimator,
+            )
+        else:
+            # Resuming repeats the last batch, which may have been interrupted, before drawing new ones.
+            batch = max(journal.last_batch - 1, 0)
+            empty_batches = 0
+            while (remaining := total - len(journal.completed)) > 0:
+                size = min(chunk_size, remaining)
+                scored = len(journal.completed)
+                batch += 1
+                async with ScoringPipeline(
+                    safety_eval,
+                    max_in_flight=max_in_flight,
+                    total=size,
+                    on_result=functools.partial(journal.write, batch=batch),
+                    is_done=journal.is_done,
+                    description=f"Simulating and evaluating batch {batch} ({scored} of {total} scored)...",
+                    estimator=estimator,
+                ) as pipeline:
+                    # A new seed per batch draws a different sample of the simulator's queries, so earlier
+                    # batches are never simulated again; repeats of journaled queries are skipped.
+                    await pipeline.simulate(
+                        simulate,
+                        target,
+                        max_simulation_results=size,
+                        randomization_seed=randomization_seed + batch - 1,
+                    )
+                if pipeline.stopped.is_set():
+                    break
+                new_items = len(journal.completed) - scored
+                # The batch repeated from a resumed journal is expected to bring few or no new queries.
+                if new_items < size and batch != journal.last_batch:
+                    # Made up for by the next batch, which asks for that many more queries.
+                    logging.warning(f"Batch {batch} brought {new_items} new queries of the {size} asked for.")
+                    empty_batches = 0 if new_items else empty_batches + 1
+                    if empty_batches >= MAX_EMPTY_BATCHES:
+                        logging.warning(
+                            "The simulator has no more new queries, "
+                            f"so {len(journal.completed)} of {total} items were scored."
+                        )
+                        break
+    return summarize_journal(journal_path)
+
+
+async def simulate_and_score_many(
+    simulate,
+    targets: dict,
+    safety_eval,
+    journal_paths: dict[str, Path],
+    total: int,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    resume: bool = False,
+    estimators: dict | None = None,
+) -> dict[str, dict]:
+    """
+    Simulate adversarial queries once and send each one to every target in `targets` concurrently.
+    Each target gets its own scoring pipeline and journal, but all of them share one evaluator pool
+    of `max_in_flight` calls. Returns summary scores per target name.
+    With `resume`, a target that already scored a query skips it while the other targets still run it.
+    With `estimators` (one per target name), each target stops being called once its estimator has
+    converged, and the simulation stops when all of them have; resumed items count towards them.
+    """
+    names = list(targets)
+    with contextlib.ExitStack() as stack:
+        scorer = stack.enter_context(SafetyScorer(safety_eval, max_in_flight))
+        progress = stack.enter_context(Progress())
+        journals = {name: stack.enter_context(SafetyJournal(journal_paths[name], resume=resume)) for name in names}
+        if resume:
+            for name, estimator in (estimators or {}).items():
+                prime_estimator(estimator, journal_paths[name])
+        async with contextlib.AsyncExitStack() as pipelines:
+            wrapped_targets = {}
+            stop_events = []
+            for name in names:
+                pipeline = await pipelines.enter_async_context(
+                    ScoringPipeline(
+                        safety_eval,
+                        max_in_flight=max_in_flight,
+                        total=total,
+                        on_result=journals[name].write,
+                        is_done=journals[name].is_done,
+                        description=f"Simulating and evaluating {name}...",
+                        scorer=scorer,
+                        progress=progress,
+                        estimator=(estimators or {}).get(name),
+                    )
+                )
+                wrapped_targets[name] = pipeline.wrap_target(targets[name])
+                stop_events.append(pipeline.stopped)
+
+            async def fan_out_target(input: dict, stream: bool = False, session_state=None, context=None):
+                results = await asyncio.gather(
+                    *(
+                        wrapped_targets[name](input, stream=stream, session_state=session_state, context=context)
+                        for name in names
+                    )
+                )
+                # The simulator only needs one conversation back; every target's reply is already queued.
+                return results[0]
+
+            if estimators:
+                if await run_until_stopped(simulate(target=fan_out_target), stop_events):
+                    logging.warning("Pass-rate estimates have converged, stopping the simulation early.")
+            else:
+                await simulate(target=fan_out_target)
+    return {name: summarize_journal(journal_paths[name]) for name in names}
@@ -0,0 +1,144 @@
+# Span tracing for the stages of an evaluation run: simulation, target calls, evaluator calls and file I/O.
+# A progress bar shows how many items are done, not where the time goes. Each traced block becomes one
+# span with its start and end time, parent span and attributes, written as one JSON object per line in
+# the shape of OpenTelemetry's OTLP span (trace and span ids, Unix-nanosecond timestamps, status).
+# Durations are also kept in memory per stage, so a run can end with latency percentiles and throughput.
+
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+_current_span: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_span", default=None)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Linear-interpolated percentile (0 <= q <= 100) of an already sorted, non-empty list.
+    """
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class StageStats:
+    """
+    Durations, error count and time window of every span recorded for one stage.
+    """
+
+    def __init__(self):
+        self.durations: list[float] = []
+        self.errors = 0
+        self.first_start = math.inf
+        self.last_end = 0.0
+
+    def add(self, start: float, end: float, error: bool):
+        self.durations.append(end - start)
+        self.errors += error
+        self.first_start = min(self.first_start, start)
+        self.last_end = max(self.last_end, end)
+
+    def summary(self) -> dict:
+        durations = sorted(self.durations)
+        window = self.last_end - self.first_start
+        return {
+            "count": len(durations),
+            "errors": self.errors,
+            "mean": sum(durations) / len(durations),
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+            "p99": percentile(durations, 99),
+            "max": durations[-1],
+            # Spans of one stage overlap when calls run concurrently, so this is completed spans per wall second.
+            "throughput_per_s": len(durations) / window if window > 0 else None,
+        }
+
+
+class Tracer:
+    """
+    Records spans for the whole process. Spans are always summarized per stage; they are also
+    written to a JSONL file between `start(path)` and `stop()`. Safe to use from coroutines and threads.
+    """
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.path: Path | None = None
+        self._stages: dict[str, StageStats] = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def start(self, path: Path):
+        """
+        Begin a new trace, exporting its spans to `path` (overwritten).
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self.trace_id = os.urandom(16).hex()
+            self.path = Path(path)
+            self._stages = {}
+            self._file = open(self.path, "w", encoding="utf-8")
+
+    def stop(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Trace the block as one span of stage `name`. The yielded attributes dict can be added to inside the block;
+        an exception escaping the block, or an "error" attribute set to True, marks the span as failed.
+        """
+        span_id = os.urandom(8).hex()
+        parent_id = _current_span.get()
+        token = _current_span.set(span_id)
+        start_ns = time.time_ns()
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield attributes
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            end = time.perf_counter()
+            _current_span.reset(token)
+            failed = failed or attributes.get("error") is True
+            self._finish(name, span_id, parent_id, start_ns, start, end, failed, attributes)
+
+    def _finish(self, name, span_id, parent_id, start_ns, start, end, failed, attributes):
+        record = {
+            "name": name,
+            "trace_id": self.trace_id,
+            "span_id": span_id,
+            "parent_span_id": parent_id,
+            "start_time_unix_nano": start_ns,
+            "end_time_unix_nano": start_ns + round((end - start) * 1e9),
+            "status": {"code": "ERROR" if failed else "OK"},
+            "attributes": attributes,
+        }
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats()
+            stats.add(start, end, failed)
+            if self._file is not None:
+                self._file.write(json.dumps(record, default=str) + "\n")
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Latency percentiles (seconds) and throughput for each stage traced since the last `start`.
+        """
+        with self._lock:
+            return {name: stats.summary() for name, stats in self._stages.items()}
+
+
+# Shared by every caller in the process, like the usage tracker and the per-endpoint rate limiters.
+tracer = Tracer()
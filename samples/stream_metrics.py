@@ -0,0 +1,156 @@
+# Serving-latency metrics for streamed target responses.
+# With stream=True the targets used to append each delta to a string and discard the timing.
+# A StreamTimer collects the deltas of one response in a list and notes when each one arrived,
+# giving time-to-first-token (TTFT), the gaps between tokens and tokens per second. StreamingStats
+# aggregates them per model, so a safety run in streaming mode also reports serving performance.
+
+import json
+import threading
+import time
+
+from stage_tracing import percentile
+
+
+class StreamTimer:
+    """
+    Times one streamed completion. Wrap the function that sends the request with `timed` so retries
+    restart the clock, then `add` every content delta as it arrives.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first: float | None = None
+        self.last: float | None = None
+        self.gaps: list[float] = []
+        self.chunks: list[str] = []
+        self.completion_tokens: int | None = None
+
+    def timed(self, send):
+        def send_and_start_clock(*args, **kwargs):
+            self.start = time.perf_counter()
+            return send(*args, **kwargs)
+
+        return send_and_start_clock
+
+    def add(self, text: str | None):
+        if not text:
+            return
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        else:
+            self.gaps.append(now - self.last)
+        self.last = now
+        self.chunks.append(text)
+
+    @property
+    def content(self) -> str:
+        return "".join(self.chunks)
+
+    @property
+    def ttft(self) -> float | None:
+        return None if self.first is None else self.first - self.start
+
+    def tokens(self) -> int:
+        # Prefer the usage block of the final chunk; otherwise each content delta is about one token.
+        return self.completion_tokens if self.completion_tokens is not None else len(self.chunks)
+
+    def tokens_per_second(self) -> float | None:
+        if self.last is None or self.last <= self.start:
+            return None
+        return self.tokens() / (self.last - self.start)
+
+
+def _sse_data(line) -> str | None:
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    if not line.startswith("data:"):
+        return None
+    return line[len("data:") :].strip()
+
+
+def iter_sse_chunks(lines):
+    """
+    Parse the JSON chunks of an OpenAI-style server-sent event stream, given its lines.
+    """
+    for line in lines:
+        data = _sse_data(line)
+        if data == "[DONE]":
+            return
+        if data:
+            yield json.loads(data)
+
+
+async def aiter_sse_chunks(lines):
+    """
+    Like iter_sse_chunks, for an async iterator of lines (e.g. httpx's Response.aiter_lines()).
+    """
+    async for line in lines:
+        data = _sse_data(line)
+        if data == "[DONE]":
+            return
+        if data:
+            yield json.loads(data)
+
+
+class StreamingStats:
+    """
+    Thread-safe per-model collection of TTFTs, inter-token gaps and tokens per second.
+    """
+
+    def __init__(self):
+        self._models: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, timer: StreamTimer):
+        with self._lock:
+            stats = self._models.setdefault(model, {"ttft": [], "gaps": [], "tokens_per_s": [], "empty": 0})
+            if timer.ttft is None:
+                # Nothing but empty deltas, e.g. a reply stopped by the content filter.
+                stats["empty"] += 1
+                return
+            stats["ttft"].append(timer.ttft)
+            stats["gaps"].extend(timer.gaps)
+            tokens_per_s = timer.tokens_per_second()
+            if tokens_per_s is not None:
+                stats["tokens_per_s"].append(tokens_per_s)
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Per model: number of streams, p50/p95/p99 TTFT and inter-token gap (seconds), mean and p50 tokens per second.
+        """
+
+        def percentiles(name: str, values: list[float]) -> dict:
+            values = sorted(values)
+            if not values:
+                return {}
+            return {f"{name}_p{q}": percentile(values, q) for q in (50, 95, 99)}
+
+        with self._lock:
+            result = {}
+            for model, stats in self._models.items():
+                tokens_per_s = sorted(stats["tokens_per_s"])
+                result[model] = {
+                    "streams": len(stats["ttft"]),
+                    "empty_streams": stats["empty"],
+                    **percentiles("ttft", stats["ttft"]),
+                    **percentiles("inter_token_gap", stats["gaps"]),
+                    "tokens_per_s_mean": sum(tokens_per_s) / len(tokens_per_s) if tokens_per_s else None,
+                    "tokens_per_s_p50": percentile(tokens_per_s, 50) if tokens_per_s else None,
+                }
+            return result
+
+
+# Shared by every target in the process, like the usage tracker.
+streaming_stats = StreamingStats()
+
+
+def streaming_target(target):
+    """
+    Wrap a simulator target so every call streams its response (the simulator itself never asks for streaming).
+    """
+
+    async def stream_target(input: dict, stream: bool = False, session_state=None, context=None):
+        return await target(input, stream=True, session_state=session_state, context=context)
+
+    return stream_target
@@ -0,0 +1,208 @@
+# Token usage and latency accounting for the model and judge calls made by the evaluation scripts.
+# Every chat completion returns a `usage` block (prompt, completion and cached prompt tokens), and the
+# SDK evaluators report the tokens their judge calls used, but none of the scripts kept them.
+# The tracker records each call's tokens and latency, tagged by role (target, simulator, safety evaluator,
+# quality judge) and model, and sums them into a per-run summary that is written next to the results.
+
+import functools
+import inspect
+import json
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+
+from stage_tracing import tracer
+
+ROLE_TARGET = "target"
+ROLE_SIMULATOR = "simulator"
+ROLE_SAFETY_EVALUATOR = "safety_evaluator"
+ROLE_QUALITY_JUDGE = "quality_judge"
+# Model tags for calls to services that do not name a model.
+SAFETY_SERVICE_MODEL = "azure-ai-content-safety"
+SIMULATOR_MODEL = "adversarial-simulator"
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def _field(obj, name: str):
+    # Works for SDK response objects, azure.ai.inference models (which are also mappings) and parsed JSON.
+    if obj is None:
+        return None
+    if isinstance(obj, Mapping):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _to_int(value) -> int:
+    # The safety service reports token counts as strings, and as "" when it has none.
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def usage_from_response(response) -> dict[str, int]:
+    """
+    Token counts from a chat completion (or the final chunk of a stream) with a `usage` block.
+    """
+    usage = _field(response, "usage")
+    return {
+        "prompt_tokens": _to_int(_field(usage, "prompt_tokens")),
+        "completion_tokens": _to_int(_field(usage, "completion_tokens")),
+        "cached_tokens": _to_int(_field(_field(usage, "prompt_tokens_details"), "cached_tokens")),
+    }
+
+
+def usage_from_result(result: dict) -> dict[str, int]:
+    """
+    Token counts reported in an SDK evaluator result, summed over its metrics.
+    Older SDK versions put "<metric>_prompt_tokens" at the top level, newer ones inside "<metric>_properties".
+    """
+    usage = dict.fromkeys(TOKEN_FIELDS, 0)
+    if not isinstance(result, dict):
+        return usage
+    for key, value in result.items():
+        if key.endswith("_prompt_tokens"):
+            usage["prompt_tokens"] += _to_int(value)
+        elif key.endswith("_completion_tokens"):
+            usage["completion_tokens"] += _to_int(value)
+    if not any(usage.values()):
+        for key, value in result.items():
+            if key.endswith("_properties") and isinstance(value, dict):
+                usage["prompt_tokens"] += _to_int(value.get("prompt_tokens"))
+                usage["completion_tokens"] += _to_int(value.get("completion_tokens"))
+    return usage
+
+
+class TrackedCall:
+    """
+    Handle for one call in progress; fill in its usage from the response before the `track` block ends.
+    """
+
+    def __init__(self):
+        self.usage = dict.fromkeys(TOKEN_FIELDS, 0)
+        self.error = False
+
+    def set_response(self, response):
+        self.usage = usage_from_response(response)
+
+    def set_result(self, result: dict):
+        self.usage = usage_from_result(result)
+
+
+class UsageTracker:
+    """
+    Thread-safe totals of calls, errors, tokens and latency per (role, model).
+    """
+
+    def __init__(self):
+        self._totals: dict[tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        role: str,
+        model: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        error: bool = False,
+    ):
+        with self._lock:
+            totals = self._totals.get((role, model))
+            if totals is None:
+                totals = self._totals[(role, model)] = {
+                    "calls": 0,
+                    "errors": 0,
+                    **dict.fromkeys(TOKEN_FIELDS, 0),
+                    "latency_total": 0.0,
+                    "latency_max": 0.0,
+                }
+            totals["calls"] += 1
+            totals["errors"] += error
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["latency_total"] += latency
+            totals["latency_max"] = max(totals["latency_max"], latency)
+
+    @contextmanager
+    def track(self, role: str, model: str):
+        """
+        Time the block as one call, also traced as a span of stage `role`.
+        Exceptions escaping the block count the call as an error.
+        """
+        call = TrackedCall()
+        with tracer.span(role, model=model) as attributes:
+            start = time.perf_counter()
+            try:
+                yield call
+            except BaseException:
+                call.error = True
+                raise
+            finally:
+                self.record(role, model, time.perf_counter() - start, error=call.error, **call.usage)
+                attributes.update(call.usage, error=call.error)
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls = []
+            for (role, model), totals in sorted(self._totals.items()):
+                calls.append(
+                    {
+                        "role": role,
+                        "model": model,
+                        **totals,
+                        "total_tokens": totals["prompt_tokens"] + totals["completion_tokens"],
+                        "latency_mean": totals["latency_total"] / totals["calls"],
+                    }
+                )
+        overall = {
+            name: sum(entry[name] for entry in calls) for name in ("calls", "errors", *TOKEN_FIELDS, "total_tokens")
+        }
+        return {"totals": overall, "calls": calls}
+
+    def write_summary(self, path: Path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+# Shared by every caller in the process, like the per-endpoint rate limiters.
+usage_tracker = UsageTracker()
+
+
+class TrackedEvaluator:
+    """
+    Records each call of a synchronous evaluator (e.g. ContentSafetyEvaluator or RelevanceEvaluator) with the
+    tokens its result reports. Keeps the wrapped evaluator's call signature, which `evaluate()` uses for
+    column mapping.
+    """
+
+    def __init__(self, evaluator, role: str, model: str, tracker: UsageTracker = usage_tracker):
+        self.__wrapped__ = evaluator
+        self.__signature__ = inspect.signature(evaluator)
+        self.role = role
+        self.model = model
+        self.tracker = tracker
+
+    def __call__(self, *args, **kwargs):
+        with self.tracker.track(self.role, self.model) as call:
+            result = self.__wrapped__(*args, **kwargs)
+            call.set_result(result)
+        return result
+
+
+def track_async(fn, role: str, model: str, tracker: UsageTracker = usage_tracker):
+    """
+    Wrap a coroutine function so each call is recorded (latency and errors only; no token counts).
+    """
+
+    @functools.wraps(fn)
+    async def tracked(*args, **kwargs):
+        with tracker.track(role, model):
+            return await fn(*args, **kwargs)
+
+    return tracked
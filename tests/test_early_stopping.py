@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("rich")
+
+from early_stopping import PassRateEstimator, wilson_interval  # noqa: E402
+from safety_scoring import EVALUATORS  # noqa: E402
+
+Z_95 = 1.959963984540054
+PASSING = dict.fromkeys(EVALUATORS, "Very low")
+FAILING = dict.fromkeys(EVALUATORS, "High")
+
+
+def test_wilson_interval_matches_the_closed_form():
+    low, high = wilson_interval(45, 50, Z_95)
+    assert low == pytest.approx(0.7864, abs=1e-4)
+    assert high == pytest.approx(0.9565, abs=1e-4)
+
+
+def test_wilson_interval_stays_within_zero_and_one():
+    assert wilson_interval(0, 0, Z_95) == (0.0, 1.0)
+    low, high = wilson_interval(20, 20, Z_95)
+    assert 0 < low < 1 and high == 1.0
+    low, high = wilson_interval(0, 20, Z_95)
+    assert low == 0.0 and 0 < high < 1
+
+
+def test_skipped_items_count_as_scored_but_not_passing():
+    estimator = PassRateEstimator()
+    estimator.update(PASSING)
+    estimator.update(None)
+    assert estimator.count == 2
+    assert estimator.report()["violence"]["pass_rate"] == 0.5
+
+
+def test_min_samples_guards_against_a_lucky_start():
+    estimator = PassRateEstimator(target_width=1.0, min_samples=10)
+    for _ in range(9):
+        estimator.update(PASSING)
+    assert not estimator.should_stop()
+    estimator.update(PASSING)
+    assert estimator.should_stop()
+
+
+def test_stops_once_every_interval_is_narrow_enough():
+    estimator = PassRateEstimator(target_width=0.1, min_samples=1)
+    while not estimator.should_stop():
+        estimator.update(PASSING)
+        assert estimator.count < 1000
+    low, high = estimator.interval("violence")
+    assert high - low <= 0.1
+
+
+def test_threshold_stops_once_the_interval_is_clearly_on_one_side():
+    without_threshold = PassRateEstimator(target_width=0.01, min_samples=1)
+    with_threshold = PassRateEstimator(target_width=0.01, threshold=0.5, min_samples=1)
+    for _ in range(30):
+        without_threshold.update(PASSING)
+        with_threshold.update(PASSING)
+    assert with_threshold.should_stop()
+    assert not without_threshold.should_stop()
+
+
+def test_threshold_inside_the_interval_keeps_the_run_going():
+    estimator = PassRateEstimator(target_width=0.01, threshold=0.5, min_samples=1)
+    for index in range(30):
+        estimator.update(PASSING if index % 2 else FAILING)
+    assert not estimator.should_stop()
@@ -0,0 +1,33 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("azure.ai.inference")
+
+from inference_async import AsyncChatTarget  # noqa: E402
+from stage_tracing import tracer  # noqa: E402
+from usage_tracking import ROLE_TARGET  # noqa: E402
+
+REQUEST_SECONDS = 0.05
+
+
+class SlowClient:
+    async def complete(self, **options):
+        await asyncio.sleep(REQUEST_SECONDS)
+        message = SimpleNamespace(content="No.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_target_latency_excludes_waiting_for_a_slot():
+    target = AsyncChatTarget("https://example.com", "key", "test-model", 0, 1, max_concurrency=1)
+    target._client = SlowClient()
+
+    async def run_all():
+        return await asyncio.gather(*(target.complete([], stream=False) for _ in range(4)))
+
+    replies = asyncio.run(run_all())
+    assert [reply["content"] for reply in replies] == ["No."] * 4
+    latency = tracer.summary()[ROLE_TARGET]
+    # With one slot the fourth request waits for three others; its recorded latency must not include that.
+    assert latency["max"] < 2 * REQUEST_SECONDS
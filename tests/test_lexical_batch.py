@@ -0,0 +1,112 @@
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("azure.ai.evaluation")
+pytest.importorskip("numpy")
+
+import nltk  # noqa: E402
+from azure.ai.evaluation import (  # noqa: E402
+    BleuScoreEvaluator,
+    F1ScoreEvaluator,
+    GleuScoreEvaluator,
+    MeteorScoreEvaluator,
+    RougeScoreEvaluator,
+    RougeType,
+)
+from lexical_batch import (  # noqa: E402
+    LexicalScorer,
+    Vocabulary,
+    _f1_score,
+    _rouge_scores,
+    ngram_overlaps,
+    score_lexical_batch,
+    tokenize_batch,
+)
+from lexical_cache import AnalysisCache  # noqa: E402
+
+SAMPLE_DATA = Path(__file__).resolve().parent.parent / "samples" / "quality-eval-testdata.jsonl"
+ROUGE_TYPES = [RougeType.ROUGE_1, RougeType.ROUGE_2, RougeType.ROUGE_L]
+ROUGE_METRICS = ("rouge_precision", "rouge_recall", "rouge_f1_score")
+# The NLTK data the SDK's tokenizer and METEOR need; the SDK downloads it on first use when it is missing.
+NLTK_DATA = ["corpora/wordnet.zip", "misc/perluniprops.zip", "tokenizers/punkt.zip", "tokenizers/punkt_tab.zip"]
+
+
+def load_pairs() -> tuple[list[str], list[str]]:
+    rows = [json.loads(line) for line in SAMPLE_DATA.read_text(encoding="utf-8").splitlines() if line.strip()]
+    # Each response against its own context, against its query, and against another row's context,
+    # plus empty and repeated-word edge cases.
+    responses = [row["response"] for row in rows] * 3 + ["", "The the the couch", "couch"]
+    ground_truths = (
+        [row["context"] for row in rows]
+        + [row["query"] for row in rows]
+        + [row["context"] for row in rows[1:] + rows[:1]]
+        + ["A couch.", "the couch couch", ""]
+    )
+    return responses, ground_truths
+
+
+RESPONSES, GROUND_TRUTHS = load_pairs()
+
+
+def has_nltk_data() -> bool:
+    try:
+        for resource in NLTK_DATA:
+            nltk.find(resource)
+    except LookupError:
+        return False
+    return True
+
+
+def test_f1_matches_the_evaluator():
+    vocabulary = Vocabulary()
+    hypotheses = tokenize_batch(RESPONSES, "f1", vocabulary)
+    references = tokenize_batch(GROUND_TRUTHS, "f1", vocabulary)
+    matches, hyp_totals, ref_totals = ngram_overlaps(hypotheses, references, 1)[0]
+    evaluator = F1ScoreEvaluator()
+    for i, (response, truth) in enumerate(zip(RESPONSES, GROUND_TRUTHS)):
+        expected = evaluator(response=response, ground_truth=truth)["f1_score"]
+        assert _f1_score(int(matches[i]), int(hyp_totals[i]), int(ref_totals[i])) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("rouge_type", ROUGE_TYPES)
+def test_rouge_matches_the_evaluator(rouge_type):
+    scores = _rouge_scores(rouge_type, RESPONSES, GROUND_TRUTHS, Vocabulary(), None)
+    evaluator = RougeScoreEvaluator(rouge_type=rouge_type)
+    for i, (response, truth) in enumerate(zip(RESPONSES, GROUND_TRUTHS)):
+        expected = evaluator(response=response, ground_truth=truth)
+        for metric in ROUGE_METRICS:
+            assert scores[metric][i] == pytest.approx(expected["rouge_properties"][metric])
+
+
+@pytest.mark.skipif(not has_nltk_data(), reason="NLTK data (punkt, wordnet, perluniprops) is not installed")
+@pytest.mark.parametrize("rouge_type", ROUGE_TYPES)
+def test_batch_and_scorer_match_every_evaluator(rouge_type):
+    evaluators = {
+        "f1_score": F1ScoreEvaluator(),
+        "rouge": RougeScoreEvaluator(rouge_type=rouge_type),
+        "bleu_score": BleuScoreEvaluator(),
+        "meteor_score": MeteorScoreEvaluator(alpha=0.9, beta=3.0, gamma=0.5),
+        "gleu_score": GleuScoreEvaluator(),
+    }
+    cache = AnalysisCache()
+    batch = score_lexical_batch(RESPONSES, GROUND_TRUTHS, rouge_type=rouge_type, cache=cache)
+    scorer = LexicalScorer(cache, rouge_type=rouge_type)
+    for i, (response, truth) in enumerate(zip(RESPONSES, GROUND_TRUTHS)):
+        expected = {}
+        for name, evaluator in evaluators.items():
+            result = evaluator(response=response, ground_truth=truth)
+            if name == "rouge":
+                expected |= {metric: result["rouge_properties"][metric] for metric in ROUGE_METRICS}
+            else:
+                expected[name] = result[name]
+        single = scorer(response=response, ground_truth=truth)
+        for metric, value in expected.items():
+            assert batch[metric][i] == pytest.approx(value), metric
+            assert single[metric] == pytest.approx(value), metric
+
+
+def test_batch_rejects_mismatched_lengths():
+    with pytest.raises(ValueError):
+        score_lexical_batch(["a"], [])
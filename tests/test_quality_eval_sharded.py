@@ -0,0 +1,79 @@
+import importlib
+import json
+import os
+
+import pytest
+
+pytest.importorskip("azure.ai.evaluation")
+pytest.importorskip("rich")
+
+LINES = [json.dumps({"query": f"question {index}", "response": "answer" * index}) + "\n" for index in range(10)]
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    # Importing builds the judge model config, which needs credentials even though no judge is called here.
+    monkeypatch.setenv("API_HOST", "github")
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    return importlib.import_module("quality_eval_sharded")
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text("".join(LINES))
+    return path
+
+
+@pytest.mark.parametrize("shard_count", [1, 2, 3, 7, 10, 25])
+def test_shards_split_the_file_on_line_boundaries(sharded, data_path, shard_count):
+    data = data_path.read_bytes()
+    shards = sharded.shard_offsets(data_path, shard_count)
+    assert 1 <= len(shards) <= shard_count
+    assert shards[0][0] == 0 and shards[-1][1] == len(data)
+    for (_, end), (start, _) in zip(shards, shards[1:]):
+        assert end == start
+    for start, end in shards:
+        assert end > start
+        assert start == 0 or data[start - 1 : start] == b"\n"
+    assert b"".join(data[start:end] for start, end in shards) == data
+
+
+def test_shards_are_the_same_on_every_call(sharded, data_path):
+    assert sharded.shard_offsets(data_path, 4) == sharded.shard_offsets(data_path, 4)
+
+
+def test_file_without_a_trailing_newline_keeps_its_last_row(sharded, tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text("".join(LINES).rstrip("\n"))
+    shards = sharded.shard_offsets(path, 3)
+    assert shards[-1][1] == path.stat().st_size
+    assert path.read_bytes()[shards[-1][0] : shards[-1][1]].endswith(b"}")
+
+
+def test_changing_the_input_invalidates_earlier_shard_results(sharded, data_path, tmp_path):
+    key = sharded.input_key(data_path, 4)
+    assert sharded.input_key(data_path, 2) != key
+    data_path.write_text("".join(LINES[:5]))
+    os.utime(data_path, ns=(0, 0))
+    assert sharded.input_key(data_path, 4) != key
+    assert sharded.shard_result_path(tmp_path, key, 0) != sharded.shard_result_path(tmp_path, key, 1)
+
+
+def test_merge_keeps_shard_order_and_weights_metrics_by_rows(sharded, data_path, tmp_path):
+    from quality_results import iter_rows, read_metrics, write_results
+
+    assert len(sharded.shard_offsets(data_path, 2)) == 2
+    key = sharded.input_key(data_path, 2)
+    with pytest.raises(FileNotFoundError):
+        sharded.merge_into(data_path, 2, tmp_path, tmp_path / "merged.jsonl")
+    scores = [[1.0, 1.0, 1.0], [0.0]]
+    for index, shard_scores in enumerate(scores):
+        rows = [
+            {"inputs.query": f"{index}-{row}", "outputs.relevance.relevance": score}
+            for row, score in enumerate(shard_scores)
+        ]
+        write_results(sharded.shard_result_path(tmp_path, key, index), rows, {"relevance.relevance": 0.5})
+    metrics = sharded.merge_into(data_path, 2, tmp_path, tmp_path / "merged.jsonl")
+    assert [row["inputs.query"] for row in iter_rows(tmp_path / "merged.jsonl")] == ["0-0", "0-1", "0-2", "1-0"]
+    assert metrics == read_metrics(tmp_path / "merged.jsonl") == {"relevance.relevance": 0.75}
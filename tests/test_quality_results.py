@@ -0,0 +1,59 @@
+import json
+
+import quality_results
+from quality_results import MetricsAccumulator, ResultsWriter, iter_rows, read_metrics, write_results
+
+ROWS = [
+    {"inputs.query": "What is 2 + 2?", "outputs.f1_score.f1_score": 1.0},
+    {"inputs.query": "Who wrote it?", "outputs.f1_score.f1_score": 0.5},
+]
+METRICS = {"f1_score.f1_score": 0.75}
+
+
+def test_rows_and_metrics_round_trip(tmp_path):
+    path = tmp_path / "results.jsonl"
+    write_results(path, ROWS, METRICS, studio_url=None)
+    lines = path.read_text().splitlines()
+    assert len(lines) == len(ROWS) + 1
+    assert json.loads(lines[-1]) == {"metrics": METRICS, "studio_url": None}
+    assert list(iter_rows(path)) == ROWS
+    assert read_metrics(path) == METRICS
+
+
+def test_unfinished_run_has_rows_but_no_metrics(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with ResultsWriter(path) as writer:
+        writer.write_row(ROWS[0])
+        assert list(iter_rows(path)) == ROWS[:1]
+        assert read_metrics(path) is None
+    assert writer.row_count == 1
+
+
+def test_metrics_are_found_behind_a_large_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(quality_results, "TAIL_READ_SIZE", 16)
+    path = tmp_path / "results.jsonl"
+    write_results(path, [{"inputs.query": "x" * 1000}], METRICS)
+    assert read_metrics(path) == METRICS
+
+
+def test_old_single_line_format_is_still_read(tmp_path):
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps({"rows": ROWS, "metrics": METRICS}))
+    assert list(iter_rows(path)) == ROWS
+    assert read_metrics(path) == METRICS
+
+
+def test_empty_file_has_no_metrics(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text("")
+    assert read_metrics(path) is None
+    assert list(iter_rows(path)) == []
+
+
+def test_accumulator_prefers_row_means_over_reported_metrics():
+    accumulator = MetricsAccumulator()
+    for row in ROWS:
+        accumulator.add_row(row)
+    accumulator.add_metrics(len(ROWS), {"f1_score.f1_score": 0.0, "f1_score.f1_score_pass_rate": 0.5})
+    accumulator.add_metrics(6, {"f1_score.f1_score_pass_rate": 1.0})
+    assert accumulator.result() == {"f1_score.f1_score": 0.75, "f1_score.f1_score_pass_rate": 0.875}
@@ -0,0 +1,100 @@
+import pytest
+from rate_limit import SAFETY_EVALUATION_LIMITER, AdaptiveRateLimiter, TransientError, classify_error
+
+
+def assert_retryable(error: Exception):
+    assert classify_error(error) == (True, None, None)
+
+
+def test_builtin_connection_errors_are_retryable():
+    assert_retryable(ConnectionResetError("reset by peer"))
+    assert_retryable(TimeoutError())
+
+
+def test_httpx_transport_errors_are_retryable():
+    httpx = pytest.importorskip("httpx")
+    request = httpx.Request("POST", "https://example.com/chat/completions")
+    assert_retryable(httpx.ConnectError("connection refused", request=request))
+    assert_retryable(httpx.ReadTimeout("timed out", request=request))
+    assert_retryable(httpx.RemoteProtocolError("server disconnected", request=request))
+
+
+def test_azure_core_transport_errors_are_retryable():
+    exceptions = pytest.importorskip("azure.core.exceptions")
+    assert_retryable(exceptions.ServiceRequestError("connection refused"))
+    assert_retryable(exceptions.ServiceResponseError("connection reset"))
+
+
+def test_openai_connection_errors_are_retryable():
+    openai = pytest.importorskip("openai")
+    httpx = pytest.importorskip("httpx")
+    request = httpx.Request("POST", "https://example.com/chat/completions")
+    assert_retryable(openai.APIConnectionError(request=request))
+    assert_retryable(openai.APITimeoutError(request=request))
+
+
+def test_requests_transport_errors_are_retryable():
+    exceptions = pytest.importorskip("requests.exceptions")
+    assert_retryable(exceptions.ConnectionError("connection reset"))
+    assert_retryable(exceptions.ReadTimeout("timed out"))
+
+
+def test_aiohttp_transport_errors_are_retryable():
+    aiohttp = pytest.importorskip("aiohttp")
+    assert_retryable(aiohttp.ServerDisconnectedError())
+    assert_retryable(aiohttp.ServerTimeoutError("timed out"))
+
+
+def test_status_codes_decide_http_errors():
+    assert classify_error(TransientError("HTTP 429", status_code=429, retry_after=2.0)) == (True, 429, 2.0)
+    not_found = Exception("not found")
+    not_found.status_code = 404
+    assert classify_error(not_found) == (False, 404, None)
+    assert classify_error(ValueError("bad input")) == (False, None, None)
+
+
+def test_message_text_does_not_make_an_error_retryable():
+    assert classify_error(ValueError("rate limit of 429 tokens exceeded")) == (False, None, None)
+
+
+def test_wrapped_errors_are_classified_by_their_cause():
+    wrapper = RuntimeError("evaluation failed")
+    wrapper.__cause__ = TransientError("HTTP 429", status_code=429, retry_after=1.0)
+    assert classify_error(wrapper) == (True, 429, 1.0)
+
+
+def test_chat_clients_leave_retries_to_the_limiter():
+    pytest.importorskip("azure.ai.inference")
+    pytest.importorskip("requests")
+    from inference_pool import ChatClientPool
+
+    with ChatClientPool() as pool:
+        client = pool.get("https://example.com", "key")
+        retry_policies = [
+            policy for policy in client._client._pipeline._impl_policies if hasattr(policy, "total_retries")
+        ]
+        assert [policy.total_retries for policy in retry_policies] == [0]
+
+
+def test_limiter_retries_connection_errors():
+    limiter = AdaptiveRateLimiter("test", initial_rate=1000, max_retries=2, max_backoff=0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionResetError("reset by peer")
+        return "ok"
+
+    assert limiter.run(flaky) == "ok"
+    assert limiter.retries == 2
+
+
+def test_initial_rate_follows_configured_concurrency(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_INITIAL_RPS", raising=False)
+    monkeypatch.setenv("AZURE_AI_MAX_CONCURRENCY", "24")
+    monkeypatch.setenv("AZURE_AI_EVAL_CONCURRENCY", "8")
+    assert AdaptiveRateLimiter("https://example.com").rate == 24
+    assert AdaptiveRateLimiter(SAFETY_EVALUATION_LIMITER).rate == 8
+    monkeypatch.setenv("RATE_LIMIT_INITIAL_RPS", "3")
+    assert AdaptiveRateLimiter("https://example.com").rate == 3
@@ -0,0 +1,95 @@
+import pickle
+from types import SimpleNamespace
+
+import pytest
+import safety_cache
+from safety_cache import CachedSafetyEvaluator, VerdictCache
+
+DAY = 24 * 60 * 60
+VERDICT = {"violence": "Very low"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(safety_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_hits_and_misses_are_counted(tmp_path, clock):
+    with VerdictCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get("a") is None
+        cache.put("a", VERDICT)
+        assert cache.get("a") == VERDICT
+        assert cache.get("a") == VERDICT
+        assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "entries": 1}
+
+
+def test_verdicts_expire_by_age_even_when_used(tmp_path, clock):
+    with VerdictCache(tmp_path / "cache.sqlite", max_age_days=1) as cache:
+        cache.put("a", VERDICT)
+        clock.now += DAY / 2
+        assert cache.get("a") == VERDICT
+        clock.now += DAY
+        assert cache.get("a") is None
+        cache.evict()
+        assert cache.stats()["entries"] == 0
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path, clock):
+    with VerdictCache(tmp_path / "cache.sqlite", max_entries=2) as cache:
+        for key in "abc":
+            cache.put(key, VERDICT)
+            clock.now += 1
+        cache.get("a")
+        cache.evict()
+        assert cache.get("a") == VERDICT
+        assert cache.get("b") is None
+        assert cache.get("c") == VERDICT
+
+
+def test_eviction_runs_after_every_batch_of_inserts(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(safety_cache, "EVICT_EVERY", 3)
+    with VerdictCache(tmp_path / "cache.sqlite", max_entries=1) as cache:
+        for index in range(3):
+            cache.put(str(index), VERDICT)
+            clock.now += 1
+        assert cache.stats()["entries"] == 1
+        assert cache.get("2") == VERDICT
+
+
+def test_entries_survive_reopening(tmp_path, clock):
+    with VerdictCache(tmp_path / "cache.sqlite") as cache:
+        cache.put("a", VERDICT)
+    with VerdictCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get("a") == VERDICT
+
+
+def test_key_parts_are_not_ambiguous():
+    assert VerdictCache.make_key("ab", "c") != VerdictCache.make_key("a", "bc")
+
+
+def test_cached_evaluator_calls_the_service_once_per_pair(tmp_path, clock):
+    calls = []
+
+    def safety_eval(*, query, response):
+        calls.append((query, response))
+        return VERDICT
+
+    with VerdictCache(tmp_path / "cache.sqlite") as cache:
+        evaluator = CachedSafetyEvaluator(safety_eval, cache, version="1")
+        for _ in range(3):
+            assert evaluator(query="q", response="r") == VERDICT
+        evaluator(query="q", response="other")
+        assert calls == [("q", "r"), ("q", "other")]
+        # A new evaluator version must not reuse the old verdicts.
+        CachedSafetyEvaluator(safety_eval, cache, version="2")(query="q", response="r")
+        assert len(calls) == 3
+
+
+def test_cache_can_be_sent_to_worker_processes(tmp_path, clock):
+    with VerdictCache(tmp_path / "cache.sqlite") as cache:
+        cache.put("a", VERDICT)
+        copy = pickle.loads(pickle.dumps(cache))
+        assert copy.get("a") == VERDICT
+        copy.close()
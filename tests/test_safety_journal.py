@@ -0,0 +1,158 @@
+import asyncio
+import functools
+import json
+
+import pytest
+
+pytest.importorskip("rich")
+
+from safety_journal import MAX_EMPTY_BATCHES, iter_journal, simulate_and_score_journaled  # noqa: E402
+from safety_scoring import APP_ERROR_MESSAGE, EVALUATORS  # noqa: E402
+
+PASSING = dict.fromkeys(EVALUATORS, "Very low")
+
+
+class FakeSimulator:
+    """
+    Sends `max_simulation_results` queries drawn from a pool of `pool_size` by `randomization_seed`,
+    and records the size of every call.
+    """
+
+    def __init__(self, pool_size: int = 1000):
+        self.pool_size = pool_size
+        self.calls: list[int] = []
+
+    async def __call__(self, *, target, max_simulation_results: int, randomization_seed: int = 0):
+        self.calls.append(max_simulation_results)
+        outputs = []
+        for index in range(min(max_simulation_results, self.pool_size)):
+            query = {"role": "user", "content": f"query {(randomization_seed * 7 + index) % self.pool_size}"}
+            result = await target({"messages": [query]}, stream=False, session_state=None, context=None)
+            outputs.append({"messages": [query, result["messages"][-1]]})
+        return outputs
+
+
+async def answer(input, stream=False, session_state=None, context=None):
+    return {"messages": input["messages"] + [{"role": "assistant", "content": "No."}]}
+
+
+def passing_eval(*, query, response):
+    return PASSING
+
+
+def run(simulate, journal_path, total, chunk_size, resume=False):
+    return asyncio.run(
+        simulate_and_score_journaled(
+            simulate,
+            answer,
+            passing_eval,
+            journal_path,
+            total=total,
+            chunk_size=chunk_size,
+            max_in_flight=2,
+            resume=resume,
+        )
+    )
+
+
+def test_each_batch_simulates_only_its_own_queries(tmp_path):
+    simulator = FakeSimulator()
+    summary = run(simulator, tmp_path / "journal.jsonl", total=23, chunk_size=5)
+    assert simulator.calls == [5, 5, 5, 5, 3]
+    assert len(list(iter_journal(tmp_path / "journal.jsonl"))) == 23
+    assert summary["violence"]["pass_rate"] == 1
+
+
+def test_repeated_queries_are_made_up_by_later_batches(tmp_path):
+    # Seeds 2 and 3 only draw queries that seeds 0 and 1 already did.
+    simulator = FakeSimulator(pool_size=12)
+    run(simulator, tmp_path / "journal.jsonl", total=12, chunk_size=5)
+    records = list(iter_journal(tmp_path / "journal.jsonl"))
+    assert len({record["query_id"] for record in records}) == len(records) == 12
+    assert simulator.calls == [5, 5, 2, 2, 2, 1, 1]
+
+
+def test_chunked_run_stops_when_the_simulator_has_no_new_queries(tmp_path):
+    simulator = FakeSimulator(pool_size=4)
+    run(simulator, tmp_path / "journal.jsonl", total=10, chunk_size=5)
+    assert len(list(iter_journal(tmp_path / "journal.jsonl"))) == 4
+    assert len(simulator.calls) == 1 + MAX_EMPTY_BATCHES
+
+
+class CountingTarget:
+    """
+    Answers every query, or fails the queries in `failing` with the app error reply, and counts the calls.
+    """
+
+    def __init__(self, failing: set[str] = frozenset()):
+        self.failing = failing
+        self.queries: list[str] = []
+
+    async def __call__(self, input, stream=False, session_state=None, context=None):
+        query = input["messages"][0]["content"]
+        self.queries.append(query)
+        reply = APP_ERROR_MESSAGE if query in self.failing else {"role": "assistant", "content": "No."}
+        return {"messages": input["messages"] + [dict(reply)]}
+
+
+def run_unchunked(target, journal_path, total, resume=False):
+    simulate = functools.partial(FakeSimulator(), max_simulation_results=total)
+    return asyncio.run(
+        simulate_and_score_journaled(
+            simulate, target, passing_eval, journal_path, total=total, max_in_flight=2, resume=resume
+        )
+    )
+
+
+def test_resume_skips_scored_queries_and_retries_app_errors(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    run_unchunked(CountingTarget(failing={"query 1", "query 3"}), journal_path, total=5)
+    statuses = [record["status"] for record in iter_journal(journal_path)]
+    assert sorted(statuses) == ["app_error", "app_error", "ok", "ok", "ok"]
+
+    target = CountingTarget()
+    summary = run_unchunked(target, journal_path, total=5, resume=True)
+    assert sorted(target.queries) == ["query 1", "query 3"]
+    records = list(iter_journal(journal_path))
+    assert len(records) == 5
+    assert all(record["status"] == "ok" for record in records)
+    assert summary["violence"]["pass_rate"] == 1
+
+
+def test_without_resume_the_journal_starts_over(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    run_unchunked(CountingTarget(), journal_path, total=3)
+    target = CountingTarget()
+    run_unchunked(target, journal_path, total=3)
+    assert len(target.queries) == 3
+    assert len(list(iter_journal(journal_path))) == 3
+
+
+def test_journal_records_hold_no_text(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    run_unchunked(CountingTarget(), journal_path, total=2)
+    text = journal_path.read_text()
+    assert "query" not in text.replace("query_id", "")
+    assert "No." not in text
+
+
+def test_chunked_resume_repeats_only_the_last_batch(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    run(FakeSimulator(), journal_path, total=10, chunk_size=5)
+    # Interrupted after two full batches, one of whose items failed.
+    records = list(iter_journal(journal_path))
+    assert [record["batch"] for record in records].count(2) == 5
+    records[-1]["status"] = "app_error"
+    journal_path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    simulator = FakeSimulator()
+    target = CountingTarget()
+    asyncio.run(
+        simulate_and_score_journaled(
+            simulator, target, passing_eval, journal_path, total=15, chunk_size=5, max_in_flight=2, resume=True
+        )
+    )
+    # Batch 2 again, where only the failed item reaches the target, then batch 3 for the last 5.
+    assert simulator.calls == [5, 5]
+    assert len(target.queries) == 1 + 5
+    assert len(list(iter_journal(journal_path))) == 15